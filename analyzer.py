@@ -1,483 +1,747 @@
-"""
-数据分析和排序模块
-
-负责对获取的消息数据进行分析、排序和统计
-"""
-
-from typing import List, Dict, Any, Optional
-from collections import defaultdict
-from datetime import datetime, timedelta
-
-import config
-
-
-class MessageAnalyzer:
-    """消息分析器"""
-    
-    def __init__(self, messages: List[Dict[str, Any]]):
-        """
-        初始化分析器
-        
-        Args:
-            messages: 消息数据列表
-        """
-        self.messages = messages
-        self.sorted_messages: List[Dict[str, Any]] = []
-        self.statistics: Dict[str, Any] = {}
-    
-    def sort_by_reactions(self, reverse: bool = True) -> List[Dict[str, Any]]:
-        """
-        按反应数量排序
-        
-        Args:
-            reverse: 是否降序排列
-            
-        Returns:
-            list: 排序后的消息列表
-        """
-        self.sorted_messages = sorted(
-            self.messages,
-            key=lambda x: x['total_reactions'],
-            reverse=reverse
-        )
-        
-        return self.sorted_messages
-    
-    def sort_by_views(self, reverse: bool = True) -> List[Dict[str, Any]]:
-        """
-        按浏览量排序
-        
-        Args:
-            reverse: 是否降序排列
-            
-        Returns:
-            list: 排序后的消息列表
-        """
-        # 过滤掉没有浏览量的消息
-        messages_with_views = [m for m in self.messages if m.get('views')]
-        
-        self.sorted_messages = sorted(
-            messages_with_views,
-            key=lambda x: x['views'] or 0,
-            reverse=reverse
-        )
-        
-        return self.sorted_messages
-    
-    def sort_by_engagement_rate(self, reverse: bool = True) -> List[Dict[str, Any]]:
-        """
-        按互动率排序（反应数/浏览量）
-        
-        Args:
-            reverse: 是否降序排列
-            
-        Returns:
-            list: 排序后的消息列表
-        """
-        # 过滤掉没有浏览量的消息
-        messages_with_views = [m for m in self.messages if m.get('views') and m['views'] > 0]
-        
-        # 计算互动率
-        for msg in messages_with_views:
-            msg['engagement_rate'] = (msg['total_reactions'] / msg['views']) * 100
-        
-        self.sorted_messages = sorted(
-            messages_with_views,
-            key=lambda x: x.get('engagement_rate', 0),
-            reverse=reverse
-        )
-        
-        return self.sorted_messages
-    
-    def sort_by_replies(self, reverse: bool = True) -> List[Dict[str, Any]]:
-        """
-        按回复数排序
-        
-        Args:
-            reverse: 是否降序排列
-            
-        Returns:
-            list: 排序后的消息列表
-        """
-        self.sorted_messages = sorted(
-            self.messages,
-            key=lambda x: x.get('replies', 0) or 0,
-            reverse=reverse
-        )
-        
-        return self.sorted_messages
-    
-    def filter_by_media_type(
-        self,
-        media_types: List[str],
-        messages: List[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """
-        按媒体类型过滤
-        
-        Args:
-            media_types: 媒体类型列表，如 ['archive', 'executable', 'video']
-            messages: 要过滤的消息列表，默认使用 self.messages
-            
-        Returns:
-            list: 过滤后的消息列表
-        """
-        source = messages or self.messages
-        
-        return [
-            m for m in source
-            if m['media']['has_media'] and m['media']['type'] in media_types
-        ]
-    
-    def filter_by_date_range(
-        self,
-        start_date: datetime = None,
-        end_date: datetime = None,
-        days: int = None,
-        messages: List[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """
-        按日期范围过滤
-        
-        Args:
-            start_date: 开始日期
-            end_date: 结束日期
-            days: 最近 N 天（与 start_date/end_date 互斥）
-            messages: 要过滤的消息列表
-            
-        Returns:
-            list: 过滤后的消息列表
-        """
-        source = messages or self.messages
-        
-        if days:
-            end_date = datetime.now(source[0]['date'].tzinfo) if source else datetime.now()
-            start_date = end_date - timedelta(days=days)
-        
-        filtered = []
-        for msg in source:
-            msg_date = msg['date']
-            if start_date and msg_date < start_date:
-                continue
-            if end_date and msg_date > end_date:
-                continue
-            filtered.append(msg)
-        
-        return filtered
-    
-    def filter_by_keyword(
-        self,
-        keywords: List[str],
-        case_sensitive: bool = False,
-        messages: List[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """
-        按关键词过滤
-        
-        Args:
-            keywords: 关键词列表
-            case_sensitive: 是否区分大小写
-            messages: 要过滤的消息列表
-            
-        Returns:
-            list: 过滤后的消息列表
-        """
-        source = messages or self.messages
-        
-        if not case_sensitive:
-            keywords = [k.lower() for k in keywords]
-        
-        filtered = []
-        for msg in source:
-            text = msg['text'] or ''
-            filename = msg['media'].get('filename') or ''
-            
-            if not case_sensitive:
-                text = text.lower()
-                filename = filename.lower()
-            
-            search_text = f"{text} {filename}"
-            
-            if any(k in search_text for k in keywords):
-                filtered.append(msg)
-        
-        return filtered
-    
-    def get_reaction_statistics(self) -> Dict[str, Any]:
-        """
-        获取反应统计数据
-        
-        Returns:
-            dict: 统计数据
-        """
-        emoji_counts = defaultdict(int)
-        emoji_messages = defaultdict(int)  # 使用该表情的消息数
-        
-        for msg in self.messages:
-            for r in msg['reactions']:
-                emoji = r['emoji']
-                emoji_counts[emoji] += r['count']
-                emoji_messages[emoji] += 1
-        
-        # 排序表情
-        sorted_emojis = sorted(
-            emoji_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        
-        return {
-            'emoji_counts': dict(sorted_emojis),
-            'emoji_messages': dict(emoji_messages),
-            'top_emojis': sorted_emojis[:10],
-            'total_reactions': sum(emoji_counts.values()),
-            'unique_emojis': len(emoji_counts),
-        }
-    
-    def get_media_statistics(self) -> Dict[str, Any]:
-        """
-        获取媒体类型统计
-        
-        Returns:
-            dict: 统计数据
-        """
-        type_counts = defaultdict(int)
-        type_reactions = defaultdict(int)
-        
-        for msg in self.messages:
-            media = msg['media']
-            if media['has_media']:
-                mtype = media['type'] or 'unknown'
-                type_counts[mtype] += 1
-                type_reactions[mtype] += msg['total_reactions']
-        
-        # 计算每种类型的平均反应数
-        type_avg = {}
-        for mtype, count in type_counts.items():
-            type_avg[mtype] = type_reactions[mtype] / count if count > 0 else 0
-        
-        return {
-            'type_counts': dict(type_counts),
-            'type_reactions': dict(type_reactions),
-            'type_average': type_avg,
-        }
-    
-    def get_time_statistics(self) -> Dict[str, Any]:
-        """
-        获取时间统计
-        
-        Returns:
-            dict: 统计数据
-        """
-        if not self.messages:
-            return {}
-        
-        # 按小时统计
-        hour_counts = defaultdict(int)
-        hour_reactions = defaultdict(int)
-        
-        # 按星期统计
-        weekday_counts = defaultdict(int)
-        weekday_reactions = defaultdict(int)
-        
-        for msg in self.messages:
-            date = msg['date']
-            hour = date.hour
-            weekday = date.weekday()
-            
-            hour_counts[hour] += 1
-            hour_reactions[hour] += msg['total_reactions']
-            
-            weekday_counts[weekday] += 1
-            weekday_reactions[weekday] += msg['total_reactions']
-        
-        # 找出最佳发布时间
-        best_hour = max(hour_reactions.items(), key=lambda x: x[1])[0] if hour_reactions else None
-        best_weekday = max(weekday_reactions.items(), key=lambda x: x[1])[0] if weekday_reactions else None
-        
-        weekday_names = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
-        
-        return {
-            'hour_distribution': dict(hour_counts),
-            'hour_reactions': dict(hour_reactions),
-            'weekday_distribution': dict(weekday_counts),
-            'weekday_reactions': dict(weekday_reactions),
-            'best_hour': best_hour,
-            'best_weekday': weekday_names[best_weekday] if best_weekday is not None else None,
-        }
-    
-    def generate_summary(self) -> Dict[str, Any]:
-        """
-        生成综合统计摘要
-        
-        Returns:
-            dict: 摘要数据
-        """
-        if not self.messages:
-            return {'message': '没有消息数据'}
-        
-        total_reactions = sum(m['total_reactions'] for m in self.messages)
-        total_views = sum(m['views'] or 0 for m in self.messages)
-        
-        # 找到最热门的消息
-        sorted_by_reactions = sorted(
-            self.messages,
-            key=lambda x: x['total_reactions'],
-            reverse=True
-        )
-        
-        top_message = sorted_by_reactions[0] if sorted_by_reactions else None
-        
-        # 日期范围
-        dates = [m['date'] for m in self.messages]
-        
-        self.statistics = {
-            'total_messages': len(self.messages),
-            'total_reactions': total_reactions,
-            'total_views': total_views,
-            'avg_reactions': total_reactions / len(self.messages) if self.messages else 0,
-            'avg_views': total_views / len(self.messages) if self.messages else 0,
-            'date_range': {
-                'start': min(dates) if dates else None,
-                'end': max(dates) if dates else None,
-            },
-            'top_message': {
-                'id': top_message['id'],
-                'reactions': top_message['total_reactions'],
-                'link': top_message['link'],
-            } if top_message else None,
-            'reaction_stats': self.get_reaction_statistics(),
-            'media_stats': self.get_media_statistics(),
-            'time_stats': self.get_time_statistics(),
-        }
-        
-        return self.statistics
-    
-    def get_top_n(
-        self,
-        n: int = None,
-        sort_by: str = 'reactions'
-    ) -> List[Dict[str, Any]]:
-        """
-        获取 Top N 消息
-        
-        Args:
-            n: 数量，默认使用配置值
-            sort_by: 排序依据，可选 'reactions', 'views', 'engagement'
-            
-        Returns:
-            list: Top N 消息列表
-        """
-        n = n or config.TOP_N_DISPLAY
-        
-        if sort_by == 'views':
-            self.sort_by_views()
-        elif sort_by == 'engagement':
-            self.sort_by_engagement_rate()
-        else:
-            self.sort_by_reactions()
-        
-        return self.sorted_messages[:n]
-
-
-def print_top_messages(
-    messages: List[Dict[str, Any]],
-    n: int = 20,
-    show_reactions: bool = True
-):
-    """
-    打印 Top 消息
-    
-    Args:
-        messages: 消息列表
-        n: 显示数量
-        show_reactions: 是否显示详细反应
-    """
-    print(f"\n{'='*60}")
-    print(f"  Top {n} 最热门消息")
-    print(f"{'='*60}\n")
-    
-    for i, msg in enumerate(messages[:n], 1):
-        # 标题行
-        reactions_str = f"🔥 {msg['total_reactions']} 反应"
-        views_str = f"👁 {msg['views']} 浏览" if msg.get('views') else ""
-        
-        print(f"#{i} | {reactions_str} | {views_str}")
-        
-        # 内容预览
-        text = msg['text'] or ''
-        if text:
-            preview = (text[:60] + '...') if len(text) > 60 else text
-            preview = preview.replace('\n', ' ')
-            print(f"   📝 {preview}")
-        
-        # 媒体信息
-        media = msg['media']
-        if media['has_media']:
-            media_str = f"   📎 [{media['type']}]"
-            if media['filename']:
-                media_str += f" {media['filename']}"
-            if media['size']:
-                size_mb = media['size'] / (1024 * 1024)
-                media_str += f" ({size_mb:.1f} MB)"
-            print(media_str)
-        
-        # 反应详情
-        if show_reactions and msg['reactions']:
-            reactions_detail = ' '.join(
-                f"{r['emoji']}×{r['count']}" for r in msg['reactions']
-            )
-            print(f"   💬 {reactions_detail}")
-        
-        # 链接
-        print(f"   🔗 {msg['link']}")
-        print()
-
-
-def print_statistics(stats: Dict[str, Any]):
-    """
-    打印统计信息
-    
-    Args:
-        stats: 统计数据
-    """
-    print(f"\n{'='*60}")
-    print(f"  统计摘要")
-    print(f"{'='*60}\n")
-    
-    print(f"📊 总体数据:")
-    print(f"   消息数量: {stats['total_messages']}")
-    print(f"   总反应数: {stats['total_reactions']}")
-    print(f"   总浏览量: {stats['total_views']}")
-    print(f"   平均反应: {stats['avg_reactions']:.1f}")
-    print(f"   平均浏览: {stats['avg_views']:.1f}")
-    
-    if stats.get('date_range', {}).get('start'):
-        start = stats['date_range']['start'].strftime('%Y-%m-%d')
-        end = stats['date_range']['end'].strftime('%Y-%m-%d')
-        print(f"   日期范围: {start} ~ {end}")
-    
-    # 表情统计
-    reaction_stats = stats.get('reaction_stats', {})
-    if reaction_stats.get('top_emojis'):
-        print(f"\n🎭 热门表情:")
-        for emoji, count in reaction_stats['top_emojis'][:5]:
-            print(f"   {emoji}: {count} 次")
-    
-    # 媒体统计
-    media_stats = stats.get('media_stats', {})
-    if media_stats.get('type_counts'):
-        print(f"\n📁 媒体类型:")
-        for mtype, count in media_stats['type_counts'].items():
-            avg = media_stats['type_average'].get(mtype, 0)
-            print(f"   {mtype}: {count} 个 (平均 {avg:.1f} 反应)")
-    
-    # 时间统计
-    time_stats = stats.get('time_stats', {})
-    if time_stats.get('best_hour') is not None:
-        print(f"\n⏰ 最佳发布时间:")
-        print(f"   时段: {time_stats['best_hour']}:00")
-        if time_stats.get('best_weekday'):
-            print(f"   星期: {time_stats['best_weekday']}")
-    
-    print()
\ No newline at end of file
+"""
+数据分析和排序模块
+
+负责对获取的消息数据进行分析、排序和统计
+"""
+
+import heapq
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import config
+
+
+# 星期名称，下标与 datetime.weekday() 对应
+_WEEKDAY_NAMES = ('周一', '周二', '周三', '周四', '周五', '周六', '周日')
+
+# 终端预览中把换行、制表符替换为空格
+_PREVIEW_TABLE = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+_MB = 1024 * 1024
+
+
+class MessageAnalyzer:
+    """消息分析器"""
+    
+    def __init__(self, messages: List[Dict[str, Any]]):
+        """
+        初始化分析器
+        
+        Args:
+            messages: 消息数据列表
+        """
+        self.sorted_messages: List[Dict[str, Any]] = []
+        self.statistics: Dict[str, Any] = {}
+        self.messages = messages
+    
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """消息数据列表"""
+        return self._messages
+    
+    @messages.setter
+    def messages(self, messages: List[Dict[str, Any]]):
+        # 替换消息列表时丢弃旧的列缓存
+        self._messages = messages
+        self.invalidate()
+    
+    def invalidate(self):
+        """
+        清空缓存的列和索引
+        
+        重新赋值 messages 时会自动调用；若原地修改了消息列表的内容，需要手动调用
+        """
+        self._cache: Dict[str, Any] = {}
+    
+    def _key(self, name: str) -> array:
+        """
+        获取消息某个数值字段的列（结构数组），首次访问时构建并缓存
+        
+        排序和统计直接读取这些紧凑的整数列，避免在每次比较时访问消息字典
+        
+        Args:
+            name: 列名，可选 'total_reactions', 'views', 'replies', 'hour', 'weekday'
+            
+        Returns:
+            array: 与 messages 下标对齐的列
+        """
+        column = self._cache.get(name)
+        if column is None:
+            messages = self._messages
+            if name == 'total_reactions':
+                column = array('q', [m['total_reactions'] for m in messages])
+            elif name in ('views', 'replies'):
+                column = array('q', [m.get(name) or 0 for m in messages])
+            elif name == 'hour':
+                column = array('b', [m['date'].hour for m in messages])
+            elif name == 'weekday':
+                column = array('b', [m['date'].weekday() for m in messages])
+            else:
+                raise KeyError(name)
+            self._cache[name] = column
+        
+        return column
+    
+    def _media_type_key(self):
+        """
+        获取媒体类型列，类型名编码为小整数，0 表示无媒体
+        
+        Returns:
+            tuple: (按编码排列的类型名列表, 编码列)
+        """
+        cached = self._cache.get('media_type')
+        if cached is None:
+            type_codes = {}
+            names: List[Optional[str]] = [None]
+            codes = array('l')
+            for m in self._messages:
+                media = m['media']
+                if media['has_media']:
+                    mtype = media['type'] or 'unknown'
+                    code = type_codes.get(mtype)
+                    if code is None:
+                        code = type_codes[mtype] = len(names)
+                        names.append(mtype)
+                    codes.append(code)
+                else:
+                    codes.append(0)
+            cached = self._cache['media_type'] = (names, codes)
+        
+        return cached
+    
+    def _get_date_index(self):
+        """
+        获取用于二分查找的日期索引
+        
+        Telegram 返回的消息按时间排列（通常为倒序），此时时间戳列是单调的，
+        可以用二分查找直接确定日期范围的边界
+        
+        Returns:
+            tuple: (升序排列的时间戳键, 是否为倒序)，日期不单调时返回 None
+        """
+        date_index = self._cache.get('date_index')
+        if date_index is None:
+            timestamps = [m['date'].timestamp() for m in self._messages]
+            pairs = list(zip(timestamps, timestamps[1:]))
+            
+            if all(a <= b for a, b in pairs):
+                date_index = (array('d', timestamps), False)
+            elif all(a >= b for a, b in pairs):
+                # 倒序时取负值，使键升序
+                date_index = (array('d', [-t for t in timestamps]), True)
+            else:
+                date_index = False
+            self._cache['date_index'] = date_index
+        
+        return date_index or None
+    
+    def _sort_by_column(
+        self,
+        column: array,
+        reverse: bool,
+        indices: List[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按列对消息排序
+        
+        Args:
+            column: 排序键所在的列
+            reverse: 是否降序排列
+            indices: 参与排序的消息下标列表，默认全部；传入的列表会被原地排序
+            
+        Returns:
+            list: 排序后的消息列表
+        """
+        if indices is None:
+            indices = list(range(len(column)))
+        
+        indices.sort(key=column.__getitem__, reverse=reverse)
+        messages = self._messages
+        
+        return [messages[i] for i in indices]
+    
+    def sort_by_reactions(self, reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        按反应数量排序
+        
+        Args:
+            reverse: 是否降序排列
+            
+        Returns:
+            list: 排序后的消息列表
+        """
+        self.sorted_messages = self._sort_by_column(self._key('total_reactions'), reverse)
+        
+        return self.sorted_messages
+    
+    def sort_by_views(self, reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        按浏览量排序
+        
+        Args:
+            reverse: 是否降序排列
+            
+        Returns:
+            list: 排序后的消息列表
+        """
+        # 过滤掉没有浏览量的消息
+        views = self._key('views')
+        with_views = [i for i, v in enumerate(views) if v]
+        
+        self.sorted_messages = self._sort_by_column(views, reverse, with_views)
+        
+        return self.sorted_messages
+    
+    def _engagement_rates(self):
+        """
+        计算互动率（反应数/浏览量），首次计算时写入每条消息的 engagement_rate 字段
+        
+        互动率整列一次算出并缓存，重复排序或取 Top N 时不再重算
+        
+        Returns:
+            tuple: (与 messages 下标对齐的互动率列, 有浏览量的消息下标)
+        """
+        rates = self._cache.get('engagement_rate')
+        if rates is None:
+            reactions = self._key('total_reactions')
+            views = self._key('views')
+            rates = array('d', [
+                (r / v) * 100 if v > 0 else 0.0
+                for r, v in zip(reactions, views)
+            ])
+            self._cache['engagement_rate'] = rates
+            
+            # 回写到消息字典，供导出使用
+            for msg, v, rate in zip(self._messages, views, rates):
+                if v > 0:
+                    msg['engagement_rate'] = rate
+        
+        # 过滤掉没有浏览量的消息
+        views = self._key('views')
+        with_views = [i for i, v in enumerate(views) if v > 0]
+        
+        return rates, with_views
+    
+    def sort_by_engagement_rate(self, reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        按互动率排序（反应数/浏览量）
+        
+        Args:
+            reverse: 是否降序排列
+            
+        Returns:
+            list: 排序后的消息列表
+        """
+        rates, with_views = self._engagement_rates()
+        
+        self.sorted_messages = self._sort_by_column(rates, reverse, with_views)
+        
+        return self.sorted_messages
+    
+    def sort_by_replies(self, reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        按回复数排序
+        
+        Args:
+            reverse: 是否降序排列
+            
+        Returns:
+            list: 排序后的消息列表
+        """
+        self.sorted_messages = self._sort_by_column(self._key('replies'), reverse)
+        
+        return self.sorted_messages
+    
+    def filter_by_media_type(
+        self,
+        media_types: List[str],
+        messages: List[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按媒体类型过滤
+        
+        Args:
+            media_types: 媒体类型列表，如 ['archive', 'executable', 'video']
+            messages: 要过滤的消息列表，默认使用 self.messages
+            
+        Returns:
+            list: 过滤后的消息列表
+        """
+        source = messages or self.messages
+        media_types = set(media_types)
+        
+        filtered = []
+        for m in source:
+            media = m['media']
+            if media['has_media'] and media['type'] in media_types:
+                filtered.append(m)
+        
+        return filtered
+    
+    def filter_by_date_range(
+        self,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        days: int = None,
+        messages: List[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按日期范围过滤
+        
+        Args:
+            start_date: 开始日期（不带时区时按 UTC 处理）
+            end_date: 结束日期（不带时区时按 UTC 处理）
+            days: 最近 N 天（与 start_date/end_date 互斥）
+            messages: 要过滤的消息列表
+            
+        Returns:
+            list: 过滤后的消息列表
+        """
+        source = messages or self.messages
+        
+        if days:
+            end_date = datetime.now(source[0]['date'].tzinfo) if source else datetime.now()
+            start_date = end_date - timedelta(days=days)
+        
+        # Telegram 的消息时间都是 UTC，不带时区的边界统一按 UTC 处理，
+        # 两条路径的结果保持一致
+        if start_date and start_date.tzinfo is None:
+            start_date = start_date.replace(tzinfo=timezone.utc)
+        if end_date and end_date.tzinfo is None:
+            end_date = end_date.replace(tzinfo=timezone.utc)
+        
+        # 对分析器自身的消息列表，日期单调时用二分查找确定边界
+        date_index = self._get_date_index() if source is self._messages else None
+        if date_index:
+            keys, descending = date_index
+            start_ts = start_date.timestamp() if start_date else None
+            end_ts = end_date.timestamp() if end_date else None
+            
+            if descending:
+                lo = bisect_left(keys, -end_ts) if end_ts is not None else 0
+                hi = bisect_right(keys, -start_ts) if start_ts is not None else len(keys)
+            else:
+                lo = bisect_left(keys, start_ts) if start_ts is not None else 0
+                hi = bisect_right(keys, end_ts) if end_ts is not None else len(keys)
+            
+            return source[lo:hi]
+        
+        filtered = []
+        for msg in source:
+            msg_date = msg['date']
+            if start_date and msg_date < start_date:
+                continue
+            if end_date and msg_date > end_date:
+                continue
+            filtered.append(msg)
+        
+        return filtered
+    
+    def filter_by_keyword(
+        self,
+        keywords: List[str],
+        case_sensitive: bool = False,
+        messages: List[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按关键词过滤
+        
+        Args:
+            keywords: 关键词列表
+            case_sensitive: 是否区分大小写
+            messages: 要过滤的消息列表
+            
+        Returns:
+            list: 过滤后的消息列表
+        """
+        source = messages or self.messages
+        
+        if not keywords:
+            return []
+        
+        # 所有关键词合并为一个预编译的正则，每条消息只需一次匹配
+        pattern = re.compile(
+            '|'.join(re.escape(k) for k in keywords),
+            0 if case_sensitive else re.IGNORECASE
+        )
+        search = pattern.search
+        
+        filtered = []
+        for msg in source:
+            if search(msg['text'] or '') or search(msg['media'].get('filename') or ''):
+                filtered.append(msg)
+        
+        return filtered
+    
+    def _scan_all(self) -> Dict[str, Any]:
+        """
+        单次遍历消息，同时累计所有统计所需的中间数据
+        
+        反应、媒体、时间统计和摘要共用这一次遍历，避免对消息列表重复扫描；
+        结果缓存到消息列表变化为止
+        
+        Returns:
+            dict: 各项累计结果
+        """
+        scan = self._cache.get('scan')
+        if scan is not None:
+            return scan
+        
+        emoji_counts = Counter()
+        emoji_messages = Counter()  # 使用该表情的消息数
+        
+        hour_counts = [0] * 24
+        hour_reactions = [0] * 24
+        weekday_counts = [0] * 7
+        weekday_reactions = [0] * 7
+        # 各时段首次出现的顺序，统计结果按此顺序输出
+        hour_order = []
+        weekday_order = []
+        type_names, type_codes = self._media_type_key()
+        type_counts = [0] * len(type_names)
+        type_reactions = [0] * len(type_names)
+        
+        total_reactions = 0
+        total_views = 0
+        date_start = None
+        date_end = None
+        
+        columns = zip(
+            self._messages,
+            self._key('total_reactions'),
+            self._key('views'),
+            self._key('hour'),
+            self._key('weekday'),
+            type_codes,
+        )
+        
+        count_emoji_messages = emoji_messages.update
+        
+        for msg, r, v, hour, weekday, code in columns:
+            total_reactions += r
+            total_views += v
+            
+            if not hour_counts[hour]:
+                hour_order.append(hour)
+            hour_counts[hour] += 1
+            hour_reactions[hour] += r
+            if not weekday_counts[weekday]:
+                weekday_order.append(weekday)
+            weekday_counts[weekday] += 1
+            weekday_reactions[weekday] += r
+            type_counts[code] += 1
+            type_reactions[code] += r
+            
+            date = msg['date']
+            if date_start is None or date < date_start:
+                date_start = date
+            if date_end is None or date > date_end:
+                date_end = date
+            
+            emojis = []
+            for x in msg['reactions']:
+                emoji = x['emoji']
+                emoji_counts[emoji] += x['count']
+                emojis.append(emoji)
+            count_emoji_messages(emojis)
+        
+        scan = self._cache['scan'] = {
+            'emoji_counts': emoji_counts,
+            'emoji_messages': emoji_messages,
+            'hour_counts': hour_counts,
+            'hour_reactions': hour_reactions,
+            'hour_order': hour_order,
+            'weekday_counts': weekday_counts,
+            'weekday_reactions': weekday_reactions,
+            'weekday_order': weekday_order,
+            'type_counts': type_counts,
+            'type_reactions': type_reactions,
+            'total_reactions': total_reactions,
+            'total_views': total_views,
+            'date_start': date_start,
+            'date_end': date_end,
+        }
+        return scan
+    
+    @staticmethod
+    def _reaction_statistics(scan: Dict[str, Any]) -> Dict[str, Any]:
+        """根据遍历结果生成反应统计"""
+        emoji_counts = scan['emoji_counts']
+        
+        # 排序表情
+        sorted_emojis = emoji_counts.most_common()
+        
+        return {
+            'emoji_counts': dict(sorted_emojis),
+            'emoji_messages': dict(scan['emoji_messages']),
+            'top_emojis': sorted_emojis[:10],
+            'total_reactions': sum(emoji_counts.values()),
+            'unique_emojis': len(emoji_counts),
+        }
+    
+    def _media_statistics(self, scan: Dict[str, Any]) -> Dict[str, Any]:
+        """根据遍历结果生成媒体类型统计"""
+        names, _ = self._media_type_key()
+        
+        # 下标 0 为无媒体消息，不参与统计
+        type_counts = dict(zip(names[1:], scan['type_counts'][1:]))
+        type_reactions = dict(zip(names[1:], scan['type_reactions'][1:]))
+        
+        # 计算每种类型的平均反应数
+        type_avg = {}
+        for mtype, count in type_counts.items():
+            type_avg[mtype] = type_reactions[mtype] / count if count > 0 else 0
+        
+        return {
+            'type_counts': type_counts,
+            'type_reactions': type_reactions,
+            'type_average': type_avg,
+        }
+    
+    @staticmethod
+    def _time_statistics(scan: Dict[str, Any]) -> Dict[str, Any]:
+        """根据遍历结果生成时间统计"""
+        # 按小时统计（只输出有消息的时段，按首次出现的顺序）
+        hour_sums = scan['hour_reactions']
+        hour_counts = {h: scan['hour_counts'][h] for h in scan['hour_order']}
+        hour_reactions = {h: hour_sums[h] for h in hour_counts}
+        
+        # 按星期统计
+        weekday_sums = scan['weekday_reactions']
+        weekday_counts = {d: scan['weekday_counts'][d] for d in scan['weekday_order']}
+        weekday_reactions = {d: weekday_sums[d] for d in weekday_counts}
+        
+        # 找出最佳发布时间，直接按下标读取分桶列表（反应数相同时取最先出现的时段）
+        best_hour = max(hour_counts, key=hour_sums.__getitem__) if hour_counts else None
+        best_weekday = max(weekday_counts, key=weekday_sums.__getitem__) if weekday_counts else None
+        
+        return {
+            'hour_distribution': hour_counts,
+            'hour_reactions': hour_reactions,
+            'weekday_distribution': weekday_counts,
+            'weekday_reactions': weekday_reactions,
+            'best_hour': best_hour,
+            'best_weekday': _WEEKDAY_NAMES[best_weekday] if best_weekday is not None else None,
+        }
+    
+    def get_reaction_statistics(self) -> Dict[str, Any]:
+        """
+        获取反应统计数据
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self._reaction_statistics(self._scan_all())
+    
+    def get_media_statistics(self) -> Dict[str, Any]:
+        """
+        获取媒体类型统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self._media_statistics(self._scan_all())
+    
+    def get_time_statistics(self) -> Dict[str, Any]:
+        """
+        获取时间统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        if not self.messages:
+            return {}
+        
+        return self._time_statistics(self._scan_all())
+    
+    def generate_summary(self) -> Dict[str, Any]:
+        """
+        生成综合统计摘要
+        
+        Returns:
+            dict: 摘要数据
+        """
+        if not self.messages:
+            return {'message': '没有消息数据'}
+        
+        scan = self._scan_all()
+        
+        total_reactions = scan['total_reactions']
+        total_views = scan['total_views']
+        
+        # 最热门的消息：直接在反应数列上取最大值（相同时取最先出现的）
+        reactions = self._key('total_reactions')
+        top_message = self._messages[max(range(len(reactions)), key=reactions.__getitem__)]
+        
+        self.statistics = {
+            'total_messages': len(self.messages),
+            'total_reactions': total_reactions,
+            'total_views': total_views,
+            'avg_reactions': total_reactions / len(self.messages) if self.messages else 0,
+            'avg_views': total_views / len(self.messages) if self.messages else 0,
+            'date_range': {
+                'start': scan['date_start'],
+                'end': scan['date_end'],
+            },
+            'top_message': {
+                'id': top_message['id'],
+                'reactions': top_message['total_reactions'],
+                'link': top_message['link'],
+            } if top_message else None,
+            'reaction_stats': self._reaction_statistics(scan),
+            'media_stats': self._media_statistics(scan),
+            'time_stats': self._time_statistics(scan),
+        }
+        
+        return self.statistics
+    
+    def get_top_n(
+        self,
+        n: int = None,
+        sort_by: str = 'reactions'
+    ) -> List[Dict[str, Any]]:
+        """
+        获取 Top N 消息
+        
+        Args:
+            n: 数量，默认使用配置值
+            sort_by: 排序依据，可选 'reactions', 'views', 'engagement'
+            
+        Returns:
+            list: Top N 消息列表
+        """
+        n = n or config.TOP_N_DISPLAY
+        
+        # 同一排序依据和数量的结果按下标缓存，重复调用时直接复用
+        cache_key = ('top', sort_by, n)
+        top = self._cache.get(cache_key)
+        
+        if top is None:
+            # 只取前 N 条时用堆选出最大的 N 个，无需对全部消息排序
+            if sort_by == 'views':
+                column = self._key('views')
+                indices = [i for i, v in enumerate(column) if v]
+            elif sort_by == 'engagement':
+                column, indices = self._engagement_rates()
+            else:
+                column = self._key('total_reactions')
+                indices = range(len(column))
+            
+            top = self._cache[cache_key] = heapq.nlargest(n, indices, key=column.__getitem__)
+        
+        messages = self._messages
+        
+        return [messages[i] for i in top]
+
+
+def print_top_messages(
+    messages: List[Dict[str, Any]],
+    n: int = 20,
+    show_reactions: bool = True
+):
+    """
+    打印 Top 消息
+    
+    所有内容先拼接到缓冲区，最后一次性写入标准输出
+    
+    Args:
+        messages: 消息列表
+        n: 显示数量
+        show_reactions: 是否显示详细反应
+    """
+    out = [
+        f"\n{'='*60}\n",
+        f"  Top {n} 最热门消息\n",
+        f"{'='*60}\n\n",
+    ]
+    
+    for i, msg in enumerate(messages[:n], 1):
+        # 标题行
+        views = msg.get('views')
+        views_str = f"👁 {views} 浏览" if views else ""
+        block = f"#{i} | 🔥 {msg['total_reactions']} 反应 | {views_str}\n"
+        
+        # 内容预览
+        text = msg['text']
+        if text:
+            preview = (text[:60] + '...') if len(text) > 60 else text
+            block += f"   📝 {preview.translate(_PREVIEW_TABLE)}\n"
+        
+        # 媒体信息
+        media = msg['media']
+        if media['has_media']:
+            block += f"   📎 [{media['type']}]"
+            if media['filename']:
+                block += f" {media['filename']}"
+            if media['size']:
+                block += f" ({media['size'] / _MB:.1f} MB)"
+            block += "\n"
+        
+        # 反应详情
+        reactions = msg['reactions']
+        if show_reactions and reactions:
+            reactions_detail = ' '.join(f"{r['emoji']}×{r['count']}" for r in reactions)
+            block += f"   💬 {reactions_detail}\n"
+        
+        # 链接
+        out.append(f"{block}   🔗 {msg['link']}\n\n")
+    
+    sys.stdout.write(''.join(out))
+
+
+def print_statistics(stats: Dict[str, Any]):
+    """
+    打印统计信息
+    
+    所有内容先拼接到缓冲区，最后一次性写入标准输出
+    
+    Args:
+        stats: 统计数据
+    """
+    out = [
+        f"\n{'='*60}\n",
+        "  统计摘要\n",
+        f"{'='*60}\n\n",
+        "📊 总体数据:\n",
+        f"   消息数量: {stats['total_messages']}\n",
+        f"   总反应数: {stats['total_reactions']}\n",
+        f"   总浏览量: {stats['total_views']}\n",
+        f"   平均反应: {stats['avg_reactions']:.1f}\n",
+        f"   平均浏览: {stats['avg_views']:.1f}\n",
+    ]
+    
+    if stats.get('date_range', {}).get('start'):
+        start = stats['date_range']['start'].strftime('%Y-%m-%d')
+        end = stats['date_range']['end'].strftime('%Y-%m-%d')
+        out.append(f"   日期范围: {start} ~ {end}\n")
+    
+    # 表情统计
+    reaction_stats = stats.get('reaction_stats', {})
+    if reaction_stats.get('top_emojis'):
+        out.append("\n🎭 热门表情:\n")
+        for emoji, count in reaction_stats['top_emojis'][:5]:
+            out.append(f"   {emoji}: {count} 次\n")
+    
+    # 媒体统计
+    media_stats = stats.get('media_stats', {})
+    if media_stats.get('type_counts'):
+        out.append("\n📁 媒体类型:\n")
+        for mtype, count in media_stats['type_counts'].items():
+            avg = media_stats['type_average'].get(mtype, 0)
+            out.append(f"   {mtype}: {count} 个 (平均 {avg:.1f} 反应)\n")
+    
+    # 时间统计
+    time_stats = stats.get('time_stats', {})
+    if time_stats.get('best_hour') is not None:
+        out.append("\n⏰ 最佳发布时间:\n")
+        out.append(f"   时段: {time_stats['best_hour']}:00\n")
+        if time_stats.get('best_weekday'):
+            out.append(f"   星期: {time_stats['best_weekday']}\n")
+    
+    out.append("\n")
+    sys.stdout.write(''.join(out))
\ No newline at end of file
@@ -55,11 +55,16 @@ MEDIA_ONLY = True
 # ============================================
 
 # 每批次获取消息后的延迟（秒）- 用于避免触发速率限制
+# 按令牌桶限速：平均每 BATCH_DELAY 秒最多处理 BATCH_SIZE 条，处理本身已足够慢时不再额外等待
 BATCH_DELAY = 0.6
 
 # 每批次处理的消息数量
 BATCH_SIZE = 100
 
+# Web 界面按日期范围分析时，把时间范围分成几段并发获取（1 表示不分段）
+# 各段共用上面的限速，并发请求更多时更容易触发 Telegram 的速率限制，按需开启
+FETCH_BUCKETS = 1
+
 
 # ============================================
 # 输出设置（仅命令行模式使用）
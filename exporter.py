@@ -7,11 +7,146 @@
 import os
 import json
 import csv
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
+
+import jinja2
+
+# 可选：更快的 JSON 序列化（原生支持 datetime）
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 import config
 
+# CSV 等逐行写入的文件使用 1MB 缓冲区，减少 write 系统调用
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# 字节转 MB（2 的幂次倒数，乘法结果与除法完全一致）
+_BYTES_TO_MB = 1.0 / (1024 * 1024)
+
+# CSV 文本预览：换行替换为空格、去掉回车，一次 translate 完成
+_NL_TABLE = str.maketrans({'\n': ' ', '\r': None})
+
+# 导出与报告中统一使用的时间格式
+_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# HTML 报告模板所在目录
+_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# 报告模板环境只创建一次；模板首次加载后编译结果会被缓存，且不再检查文件修改时间
+_REPORT_ENV = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(_TEMPLATE_DIR),
+    autoescape=True,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+
+
+def _json_default(obj: Any) -> Any:
+    """JSON 序列化钩子：仅对无法直接序列化的值调用（如 datetime）"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dump_json(obj: Any) -> bytes:
+    """
+    序列化为带缩进的 UTF-8 JSON 字节
+    
+    Args:
+        obj: 待序列化的对象
+        
+    Returns:
+        bytes: JSON 字节串
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(
+            obj,
+            default=_json_default,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        obj, ensure_ascii=False, indent=2, default=_json_default
+    ).encode('utf-8')
+
+
+@contextmanager
+def _atomic_open(filepath: str, mode: str = 'w', **kwargs):
+    """
+    原子写入：先写同目录下的临时文件，完整落盘后再替换目标文件
+    
+    写入中途出错时目标文件保持原样，读取方不会看到写了一半的文件。
+    每次写入使用独立的临时文件，同一目标的并发写入互不干扰。
+    
+    Args:
+        filepath: 目标文件路径
+        mode: 打开模式
+        **kwargs: 传给 open() 的其他参数
+        
+    Yields:
+        临时文件对象
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(filepath) or '.',
+        prefix=os.path.basename(filepath) + '.',
+        suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def iter_json_export(
+    data: List[Dict[str, Any]],
+    stats: Optional[Dict[str, Any]] = None
+) -> Iterator[bytes]:
+    """
+    逐块生成 JSON 导出文档，每次只序列化一条消息
+    
+    输出与整体序列化 {'exported_at', 'total_messages', 'messages', 'statistics'}
+    的缩进格式一致，但不会在内存中同时持有整份文档。
+    
+    Args:
+        data: 消息数据列表
+        stats: 统计数据，为空时不输出 statistics 字段
+        
+    Yields:
+        bytes: UTF-8 编码的 JSON 片段
+    """
+    yield (
+        '{\n'
+        f'  "exported_at": "{datetime.now().isoformat()}",\n'
+        f'  "total_messages": {len(data)},\n'
+        '  "messages": ['
+    ).encode('utf-8')
+    
+    # 嵌套在数组中的元素需要多缩进 4 个空格；字符串内的换行已被转义，可直接替换
+    separator = b'\n    '
+    for msg in data:
+        yield separator + _dump_json(msg).replace(b'\n', b'\n    ')
+        separator = b',\n    '
+    yield b'\n  ]' if data else b']'
+    
+    if stats:
+        yield b',\n  "statistics": ' + _dump_json(stats).replace(b'\n', b'\n  ')
+    yield b'\n}'
+
 
 class Exporter:
     """数据导出器"""
@@ -28,27 +163,12 @@ class Exporter:
     
     def _ensure_output_dir(self):
         """确保输出目录存在"""
-        if not os.path.exists(self.output_dir):
+        # 直接创建，已存在时忽略，省去一次 exists 检查
+        try:
             os.makedirs(self.output_dir)
-            print(f"已创建输出目录: {self.output_dir}")
-    
-    def _serialize_message(self, msg: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        序列化消息数据（处理日期等不可直接序列化的类型）
-        
-        Args:
-            msg: 消息数据
-            
-        Returns:
-            dict: 可序列化的消息数据
-        """
-        serialized = msg.copy()
-        
-        # 转换日期
-        if 'date' in serialized and serialized['date']:
-            serialized['date'] = serialized['date'].isoformat()
-        
-        return serialized
+        except FileExistsError:
+            return
+        print(f"已创建输出目录: {self.output_dir}")
     
     def export_to_json(
         self,
@@ -72,31 +192,10 @@ class Exporter:
         filename = filename or config.OUTPUT_FILENAME
         filepath = os.path.join(self.output_dir, f"{filename}.json")
         
-        # 序列化消息
-        serialized_data = [self._serialize_message(msg) for msg in data]
-        
-        # 构建输出数据
-        output = {
-            'exported_at': datetime.now().isoformat(),
-            'total_messages': len(serialized_data),
-            'messages': serialized_data,
-        }
-        
-        # 添加统计数据
-        if include_stats and stats:
-            # 处理统计数据中的日期
-            stats_copy = stats.copy()
-            if 'date_range' in stats_copy:
-                date_range = stats_copy['date_range']
-                if date_range.get('start'):
-                    date_range['start'] = date_range['start'].isoformat()
-                if date_range.get('end'):
-                    date_range['end'] = date_range['end'].isoformat()
-            output['statistics'] = stats_copy
-        
-        # 写入文件
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        # 逐条序列化消息并流式写入，内存中不保留整份文档
+        chunks = iter_json_export(data, stats if include_stats else None)
+        with _atomic_open(filepath, 'wb', buffering=_WRITE_BUFFER_SIZE) as f:
+            f.writelines(chunks)
         
         print(f"✓ 已导出 JSON: {filepath}")
         return filepath
@@ -139,48 +238,60 @@ class Exporter:
         if include_reactions:
             fieldnames.append('reactions_detail')
         
-        # 写入 CSV
-        with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            
+        def _rows():
+            """逐条生成 CSV 行"""
+            strftime = datetime.strftime
             for i, msg in enumerate(data, 1):
+                media = msg['media']
+                
                 # 处理文本预览
                 text = msg.get('text') or ''
-                text_preview = (text[:100] + '...') if len(text) > 100 else text
-                text_preview = text_preview.replace('\n', ' ').replace('\r', '')
+                text_preview = text[:100]
+                if len(text) > 100:
+                    text_preview += '...'
+                text_preview = text_preview.translate(_NL_TABLE)
                 
                 # 处理日期
                 date_str = ''
                 if msg.get('date'):
-                    date_str = msg['date'].strftime('%Y-%m-%d %H:%M:%S')
+                    date_str = strftime(msg['date'], _DATETIME_FORMAT)
                 
                 # 处理文件大小
                 file_size_mb = ''
-                if msg['media'].get('size'):
-                    file_size_mb = f"{msg['media']['size'] / (1024*1024):.2f}"
+                if media.get('has_media'):
+                    size = media.get('size')
+                    if size:
+                        file_size_mb = f"{size * _BYTES_TO_MB:.2f}"
                 
-                row = {
-                    'rank': i,
-                    'id': msg['id'],
-                    'date': date_str,
-                    'total_reactions': msg['total_reactions'],
-                    'views': msg.get('views') or '',
-                    'forwards': msg.get('forwards') or '',
-                    'media_type': msg['media'].get('type') or '',
-                    'filename': msg['media'].get('filename') or '',
-                    'file_size_mb': file_size_mb,
-                    'text_preview': text_preview,
-                    'link': msg['link'],
-                }
+                # 字段顺序与 fieldnames 一致
+                row = (
+                    i,
+                    msg['id'],
+                    date_str,
+                    msg['total_reactions'],
+                    msg.get('views') or '',
+                    msg.get('forwards') or '',
+                    media.get('type') or '',
+                    media.get('filename') or '',
+                    file_size_mb,
+                    text_preview,
+                    msg['link'],
+                )
                 
                 if include_reactions:
                     reactions_str = ', '.join(
-                        f"{r['emoji']}:{r['count']}" for r in msg['reactions']
+                        r['emoji'] + ':' + str(r['count']) for r in msg['reactions']
                     )
-                    row['reactions_detail'] = reactions_str
+                    row += (reactions_str,)
                 
-                writer.writerow(row)
+                yield row
+        
+        # 写入 CSV（整批交给 writerows，由 C 层迭代）
+        with _atomic_open(filepath, 'w', encoding='utf-8-sig', newline='',
+                          buffering=_WRITE_BUFFER_SIZE) as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(_rows())
         
         print(f"✓ 已导出 CSV: {filepath}")
         return filepath
@@ -203,22 +314,14 @@ class Exporter:
         filename = filename or f"{config.OUTPUT_FILENAME}_stats"
         filepath = os.path.join(self.output_dir, f"{filename}.json")
         
-        # 处理日期
-        stats_copy = stats.copy()
-        if 'date_range' in stats_copy:
-            date_range = stats_copy['date_range']
-            if date_range.get('start'):
-                date_range['start'] = date_range['start'].isoformat()
-            if date_range.get('end'):
-                date_range['end'] = date_range['end'].isoformat()
-        
         output = {
             'exported_at': datetime.now().isoformat(),
-            'statistics': stats_copy,
+            'statistics': stats,
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        payload = _dump_json(output)
+        with _atomic_open(filepath, 'wb') as f:
+            f.write(payload)
         
         print(f"✓ 已导出统计数据: {filepath}")
         return filepath
@@ -247,7 +350,22 @@ class Exporter:
         
         exported = {}
         
-        if format in ('json', 'both'):
+        if format == 'both':
+            # JSON 在后台线程写盘，主线程同时生成 CSV
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                json_future = pool.submit(
+                    self.export_to_json,
+                    data,
+                    filename,
+                    include_stats=True,
+                    stats=stats
+                )
+                csv_path = self.export_to_csv(data, filename)
+                exported['json'] = json_future.result()
+            exported['csv'] = csv_path
+            return exported
+        
+        if format == 'json':
             exported['json'] = self.export_to_json(
                 data,
                 filename,
@@ -255,7 +373,7 @@ class Exporter:
                 stats=stats
             )
         
-        if format in ('csv', 'both'):
+        if format == 'csv':
             exported['csv'] = self.export_to_csv(data, filename)
         
         return exported
@@ -272,8 +390,7 @@ class ReportGenerator:
             output_dir: 输出目录
         """
         self.output_dir = output_dir or config.OUTPUT_DIR
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
     
     def generate_markdown_report(
         self,
@@ -296,13 +413,16 @@ class ReportGenerator:
         """
         filename = filename or f"{config.OUTPUT_FILENAME}_report"
         filepath = os.path.join(self.output_dir, f"{filename}.md")
+        top = messages[:50]
+        top_n = len(top)
+        now_str = datetime.now().strftime(_DATETIME_FORMAT)
         
         lines = []
         
         # 标题
         lines.append(f"# 📊 Telegram 频道反应统计报告")
         lines.append("")
-        lines.append(f"> 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        lines.append(f"> 生成时间: {now_str}")
         lines.append("")
         
         # 频道信息
@@ -350,19 +470,20 @@ class ReportGenerator:
             lines.append("")
         
         # Top 消息列表
-        lines.append(f"## 🔥 Top {min(50, len(messages))} 热门消息")
+        lines.append(f"## 🔥 Top {top_n} 热门消息")
         lines.append("")
         
-        for i, msg in enumerate(messages[:50], 1):
-            lines.append(f"### #{i} - {msg['total_reactions']} 反应")
-            lines.append("")
+        # 每条消息拼成一个完整的块，按下标写入预分配的列表
+        message_blocks = [None] * top_n
+        for i, msg in enumerate(top):
+            block = f"### #{i + 1} - {msg['total_reactions']} 反应\n\n"
             
             # 消息内容
-            if msg.get('text'):
-                text = msg['text'][:200] + ('...' if len(msg['text']) > 200 else '')
+            text = msg.get('text')
+            if text:
+                text = text[:200] + ('...' if len(text) > 200 else '')
                 text = text.replace('\n', ' ')
-                lines.append(f"> {text}")
-                lines.append("")
+                block += f"> {text}\n\n"
             
             # 媒体信息
             media = msg['media']
@@ -371,24 +492,22 @@ class ReportGenerator:
                 if media['filename']:
                     media_info += f": {media['filename']}"
                 if media['size']:
-                    size_mb = media['size'] / (1024 * 1024)
+                    size_mb = media['size'] * _BYTES_TO_MB
                     media_info += f" ({size_mb:.1f} MB)"
-                lines.append(media_info)
-                lines.append("")
-            
-            # 反应详情
-            reactions_str = ' '.join(f"{r['emoji']}×{r['count']}" for r in msg['reactions'])
-            lines.append(f"💬 {reactions_str}")
-            lines.append("")
+                block += f"{media_info}\n\n"
             
-            # 链接
-            lines.append(f"🔗 [{msg['link']}]({msg['link']})")
-            lines.append("")
-            lines.append("---")
-            lines.append("")
+            # 反应详情与链接
+            reactions_str = ' '.join(r['emoji'] + '×' + str(r['count']) for r in msg['reactions'])
+            block += (
+                f"💬 {reactions_str}\n\n"
+                f"🔗 [{msg['link']}]({msg['link']})\n\n"
+                "---\n"
+            )
+            message_blocks[i] = block
+        lines.extend(message_blocks)
         
         # 写入文件
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with _atomic_open(filepath, 'w', encoding='utf-8') as f:
             f.write('\n'.join(lines))
         
         print(f"✓ 已生成报告: {filepath}")
@@ -415,188 +534,56 @@ class ReportGenerator:
         """
         filename = filename or f"{config.OUTPUT_FILENAME}_report"
         filepath = os.path.join(self.output_dir, f"{filename}.html")
-        
-        html = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Telegram 反应统计报告 - {channel_info.get('title', 'N/A')}</title>
-    <style>
-        * {{ box-sizing: border-box; }}
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-            background: #f5f5f5;
-            color: #333;
-        }}
-        h1 {{ color: #0088cc; border-bottom: 2px solid #0088cc; padding-bottom: 10px; }}
-        h2 {{ color: #333; margin-top: 30px; }}
-        .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 15px;
-            margin: 20px 0;
-        }}
-        .stat-card {{
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-            text-align: center;
-        }}
-        .stat-card .value {{
-            font-size: 2em;
-            font-weight: bold;
-            color: #0088cc;
-        }}
-        .stat-card .label {{
-            color: #666;
-            margin-top: 5px;
-        }}
-        .message-card {{
-            background: white;
-            padding: 20px;
-            margin: 15px 0;
-            border-radius: 10px;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }}
-        .message-card .header {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 10px;
-        }}
-        .message-card .rank {{
-            font-size: 1.5em;
-            font-weight: bold;
-            color: #0088cc;
-        }}
-        .message-card .reactions {{
-            font-size: 1.2em;
-            color: #ff6b6b;
-        }}
-        .message-card .content {{
-            color: #666;
-            margin: 10px 0;
-            line-height: 1.5;
-        }}
-        .message-card .media {{
-            background: #f8f9fa;
-            padding: 10px;
-            border-radius: 5px;
-            margin: 10px 0;
-        }}
-        .message-card .emoji-row {{
-            font-size: 1.1em;
-            margin: 10px 0;
-        }}
-        .message-card .link {{
-            color: #0088cc;
-            text-decoration: none;
-        }}
-        .message-card .link:hover {{
-            text-decoration: underline;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            background: white;
-            border-radius: 10px;
-            overflow: hidden;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }}
-        th, td {{
-            padding: 12px;
-            text-align: left;
-            border-bottom: 1px solid #eee;
-        }}
-        th {{ background: #0088cc; color: white; }}
-        tr:hover {{ background: #f8f9fa; }}
-        .emoji-table td:first-child {{ font-size: 1.5em; }}
-    </style>
-</head>
-<body>
-    <h1>📊 Telegram 频道反应统计报告</h1>
-    <p>频道: <strong>{channel_info.get('title', 'N/A')}</strong> | 
-       生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-    
-    <h2>📈 统计概览</h2>
-    <div class="stats-grid">
-        <div class="stat-card">
-            <div class="value">{stats['total_messages']}</div>
-            <div class="label">分析消息数</div>
-        </div>
-        <div class="stat-card">
-            <div class="value">{stats['total_reactions']}</div>
-            <div class="label">总反应数</div>
-        </div>
-        <div class="stat-card">
-            <div class="value">{stats['total_views']}</div>
-            <div class="label">总浏览量</div>
-        </div>
-        <div class="stat-card">
-            <div class="value">{stats['avg_reactions']:.1f}</div>
-            <div class="label">平均反应</div>
-        </div>
-    </div>
-"""
+        top = messages[:50]
+        top_n = len(top)
+        
+        now_str = datetime.now().strftime(_DATETIME_FORMAT)
+        
+        # 模板只接收已取好的平铺值，避免在渲染中反复查找字典
+        context = {
+            'title': channel_info.get('title', 'N/A'),
+            'generated_at': now_str,
+            'total_messages': stats['total_messages'],
+            'total_reactions': stats['total_reactions'],
+            'total_views': stats['total_views'],
+            'avg_reactions': stats['avg_reactions'],
+        }
         
         # 热门表情
-        reaction_stats = stats.get('reaction_stats', {})
-        if reaction_stats.get('top_emojis'):
-            html += """
-    <h2>🎭 热门表情</h2>
-    <table class="emoji-table">
-        <tr><th>表情</th><th>使用次数</th></tr>
-"""
-            for emoji, count in reaction_stats['top_emojis'][:10]:
-                html += f"        <tr><td>{emoji}</td><td>{count}</td></tr>\n"
-            html += "    </table>\n"
-        
-        # Top 消息
-        html += f"""
-    <h2>🔥 Top {min(50, len(messages))} 热门消息</h2>
-"""
-        
-        for i, msg in enumerate(messages[:50], 1):
-            text = msg.get('text', '')[:200] + ('...' if len(msg.get('text', '')) > 200 else '')
-            text = text.replace('\n', ' ').replace('<', '&lt;').replace('>', '&gt;')
+        reaction_stats = stats.get('reaction_stats') or {}
+        context['top_emojis'] = (reaction_stats.get('top_emojis') or ())[:10]
+        
+        # Top 消息：只在 Python 中准备展示数据，转义交给模板的 autoescape
+        cards = [None] * top_n
+        for i, msg in enumerate(top):
+            text = msg.get('text') or ''
+            text = text[:200] + ('...' if len(text) > 200 else '')
+            text = text.replace('\n', ' ')
             
-            media_html = ""
-            if msg['media']['has_media']:
-                media_info = f"📎 {msg['media']['type']}"
-                if msg['media']['filename']:
-                    media_info += f": {msg['media']['filename']}"
-                if msg['media']['size']:
-                    size_mb = msg['media']['size'] / (1024 * 1024)
+            media = msg['media']
+            media_info = ''
+            if media['has_media']:
+                media_info = f"📎 {media['type']}"
+                if media['filename']:
+                    media_info += f": {media['filename']}"
+                if media['size']:
+                    size_mb = media['size'] * _BYTES_TO_MB
                     media_info += f" ({size_mb:.1f} MB)"
-                media_html = f'<div class="media">{media_info}</div>'
-            
-            reactions_html = ' '.join(f"{r['emoji']}×{r['count']}" for r in msg['reactions'])
             
-            html += f"""
-    <div class="message-card">
-        <div class="header">
-            <span class="rank">#{i}</span>
-            <span class="reactions">🔥 {msg['total_reactions']} 反应</span>
-        </div>
-        <div class="content">{text if text else '[媒体文件]'}</div>
-        {media_html}
-        <div class="emoji-row">💬 {reactions_html}</div>
-        <a href="{msg['link']}" target="_blank" class="link">🔗 查看原消息</a>
-    </div>
-"""
-        
-        html += """
-</body>
-</html>
-"""
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(html)
+            cards[i] = {
+                'rank': i + 1,
+                'total_reactions': msg['total_reactions'],
+                'text': text,
+                'media_info': media_info,
+                'reactions': ' '.join(r['emoji'] + '×' + str(r['count']) for r in msg['reactions']),
+                'link': msg['link'],
+            }
+        
+        template = _REPORT_ENV.get_template('report.html.j2')
+        
+        # 模板分块流式写入文件
+        with _atomic_open(filepath, 'w', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+            template.stream(context, cards=cards).dump(f)
         
         print(f"✓ 已生成 HTML 报告: {filepath}")
         return filepath
\ No newline at end of file
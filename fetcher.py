@@ -5,8 +5,14 @@
 """
 
 import asyncio
+import json
+import random
+import sqlite3
+import sys
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Union
+from operator import itemgetter
+from typing import Optional, List, Dict, Any, AsyncIterator, Union
 
 from telethon import TelegramClient
 from telethon.errors import (
@@ -34,9 +40,66 @@ try:
 except ImportError:
     HAS_TQDM = False
 
+# 可选：更快的 JSON 序列化（原生支持 datetime）
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 import config
 
 
+# 文件扩展名 → 媒体类型（模块加载时构建一次，按扩展名直接查表）
+_EXT_TO_TYPE = {
+    **dict.fromkeys(('zip', 'rar', '7z', 'tar', 'gz'), 'archive'),
+    **dict.fromkeys(('exe', 'msi', 'apk', 'ipa'), 'executable'),
+    **dict.fromkeys(('mp4', 'mkv', 'avi', 'mov', 'wmv', 'flv'), 'video'),
+    **dict.fromkeys(('mp3', 'flac', 'wav', 'aac', 'ogg'), 'audio'),
+    **dict.fromkeys(('pdf', 'doc', 'docx', 'txt', 'epub'), 'document'),
+    **dict.fromkeys(('jpg', 'jpeg', 'png', 'gif', 'webp'), 'image'),
+}
+
+
+# 获取频道时的已知错误 → 提示信息
+_CHANNEL_ERROR_MESSAGES = {
+    ChannelPrivateError: "✗ 错误: 这是一个私有频道，你没有访问权限",
+    ChannelInvalidError: "✗ 错误: 无效的频道",
+    UsernameInvalidError: "✗ 错误: 无效的用户名格式",
+    UsernameNotOccupiedError: "✗ 错误: 该用户名不存在",
+}
+_CHANNEL_ERRORS = tuple(_CHANNEL_ERROR_MESSAGES)
+
+
+class _TokenBucket:
+    """
+    令牌桶限速器
+    
+    令牌按固定速率补充，最多积累 capacity 个；取令牌时不足的部分记为欠账并等待，
+    因此只有在实际超过速率时才会休眠，处理本身已经足够慢时不会额外等待。
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量（允许的突发量）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+    
+    async def acquire(self, n: float = 1):
+        """取出 n 个令牌，不足时等待到令牌补足"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= n
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
 class TelegramFetcher:
     """Telegram 消息获取器"""
     
@@ -44,7 +107,16 @@ class TelegramFetcher:
         """初始化获取器"""
         self.client: Optional[TelegramClient] = None
         self.channel = None
+        # 预先解析好的 InputPeer，供 iter_messages 等请求直接使用
+        self.input_channel = None
         self.channel_info: Dict[str, Any] = {}
+        # 消息链接前缀，频道确定后计算一次
+        self._tg_link_prefix: Optional[str] = None
+        self._web_link_prefix: Optional[str] = None
+        # 平均每 BATCH_DELAY 秒最多处理 BATCH_SIZE 条消息；同一获取器上并发的多次获取共享同一限速
+        self._limiter: Optional[_TokenBucket] = None
+        if config.BATCH_DELAY > 0:
+            self._limiter = _TokenBucket(config.BATCH_SIZE / config.BATCH_DELAY, config.BATCH_SIZE)
         
     async def connect(self) -> bool:
         """
@@ -62,6 +134,7 @@ class TelegramFetcher:
         )
         
         await self.client.start()
+        self._enable_session_wal()
         
         # 获取当前用户信息
         me = await self.client.get_me()
@@ -69,6 +142,22 @@ class TelegramFetcher:
         
         return True
     
+    def _enable_session_wal(self):
+        """
+        将 SQLite 会话文件切换为 WAL 日志模式
+        
+        会话写入实体缓存时不再阻塞读取，减少长时间运行中的 "database is locked"。
+        依赖 Telethon SQLiteSession 的内部接口，不可用时直接跳过。
+        """
+        session = self.client.session
+        if getattr(session, 'filename', ':memory:') == ':memory:' or not hasattr(session, '_execute'):
+            return
+        try:
+            session._execute('PRAGMA journal_mode=WAL')
+            session._execute('PRAGMA synchronous=NORMAL')
+        except sqlite3.Error:
+            pass
+    
     async def disconnect(self):
         """断开连接"""
         if self.client:
@@ -91,6 +180,7 @@ class TelegramFetcher:
         
         try:
             self.channel = await self.client.get_entity(target)
+            self.input_channel = await self.client.get_input_entity(self.channel)
             
             # 提取频道信息
             if isinstance(self.channel, Channel):
@@ -119,6 +209,8 @@ class TelegramFetcher:
                     'participants_count': None,
                 }
             
+            self._set_link_prefixes()
+            
             print(f"✓ 已获取: {self.channel_info['title']}")
             if self.channel_info['username']:
                 print(f"  用户名: @{self.channel_info['username']}")
@@ -127,17 +219,8 @@ class TelegramFetcher:
             
             return True
             
-        except ChannelPrivateError:
-            print("✗ 错误: 这是一个私有频道，你没有访问权限")
-            return False
-        except ChannelInvalidError:
-            print("✗ 错误: 无效的频道")
-            return False
-        except UsernameInvalidError:
-            print("✗ 错误: 无效的用户名格式")
-            return False
-        except UsernameNotOccupiedError:
-            print("✗ 错误: 该用户名不存在")
+        except _CHANNEL_ERRORS as e:
+            print(_CHANNEL_ERROR_MESSAGES[type(e)])
             return False
         except Exception as e:
             print(f"✗ 错误: {type(e).__name__}: {e}")
@@ -192,22 +275,13 @@ class TelegramFetcher:
                 info['size'] = doc.size
                 # 尝试获取文件名
                 for attr in doc.attributes:
-                    if isinstance(attr, DocumentAttributeFilename):
+                    if type(attr) is DocumentAttributeFilename:
                         info['filename'] = attr.file_name
-                        # 根据扩展名细分类型
-                        name = attr.file_name.lower()
-                        if name.endswith(('.zip', '.rar', '.7z', '.tar', '.gz')):
-                            info['type'] = 'archive'
-                        elif name.endswith(('.exe', '.msi', '.apk', '.ipa')):
-                            info['type'] = 'executable'
-                        elif name.endswith(('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv')):
-                            info['type'] = 'video'
-                        elif name.endswith(('.mp3', '.flac', '.wav', '.aac', '.ogg')):
-                            info['type'] = 'audio'
-                        elif name.endswith(('.pdf', '.doc', '.docx', '.txt', '.epub')):
-                            info['type'] = 'document'
-                        elif name.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                            info['type'] = 'image'
+                        # 根据扩展名细分类型（没有扩展名时保持 document）
+                        name = attr.file_name
+                        if '.' in name:
+                            ext = name.rpartition('.')[2].lower()
+                            info['type'] = _EXT_TO_TYPE.get(ext, 'document')
                         break
         elif isinstance(media, MessageMediaPhoto):
             info['type'] = 'photo'
@@ -218,22 +292,12 @@ class TelegramFetcher:
         
         return info
     
-    def _get_message_link(self, message_id: int) -> dict:
-        """
-        生成消息链接（包含深度链接和普通链接）
-        
-        Args:
-            message_id: 消息 ID
-            
-        Returns:
-            dict: 包含 tg_link（深度链接）和 web_link（网页链接）的字典
-        """
+    def _set_link_prefixes(self):
+        """根据当前频道信息预先计算消息链接前缀（频道不变时只需计算一次）"""
         if self.channel_info.get('username'):
             username = self.channel_info['username']
-            return {
-                'tg_link': f"tg://resolve?domain={username}&post={message_id}",
-                'web_link': f"https://t.me/{username}/{message_id}"
-            }
+            self._tg_link_prefix = f"tg://resolve?domain={username}&post="
+            self._web_link_prefix = f"https://t.me/{username}/"
         else:
             # 私有频道/群组需要特殊格式
             channel_id = str(self.channel_info['id'])
@@ -244,10 +308,26 @@ class TelegramFetcher:
                 short_id = channel_id[1:]
             else:
                 short_id = channel_id
-            return {
-                'tg_link': f"tg://privatepost?channel={short_id}&post={message_id}",
-                'web_link': f"https://t.me/c/{short_id}/{message_id}"
-            }
+            self._tg_link_prefix = f"tg://privatepost?channel={short_id}&post="
+            self._web_link_prefix = f"https://t.me/c/{short_id}/"
+    
+    def _get_message_link(self, message_id: int) -> dict:
+        """
+        生成消息链接（包含深度链接和普通链接）
+        
+        Args:
+            message_id: 消息 ID
+            
+        Returns:
+            dict: 包含 tg_link（深度链接）和 web_link（网页链接）的字典
+        """
+        if self._tg_link_prefix is None:
+            self._set_link_prefixes()
+        post = str(message_id)
+        return {
+            'tg_link': self._tg_link_prefix + post,
+            'web_link': self._web_link_prefix + post
+        }
     
     async def fetch_messages(
         self,
@@ -256,11 +336,80 @@ class TelegramFetcher:
         media_only: bool = None,
         progress_callback=None,
         offset_date: datetime = None,
-        end_date: datetime = None
+        end_date: datetime = None,
+        jsonl_path: str = None,
+        safe_date_boundary: bool = False,
+        quiet: bool = False
     ) -> List[Dict[str, Any]]:
         """
         获取消息和反应数据
         
+        其余参数含义同 iter_messages。
+        
+        Args:
+            jsonl_path: 若指定，消息经有界队列流式写入该 JSON Lines 文件，不在内存中累积
+            
+        Returns:
+            list: 消息数据列表（指定 jsonl_path 时为空列表）
+        """
+        messages = self.iter_messages(
+            limit=limit,
+            min_reactions=min_reactions,
+            media_only=media_only,
+            progress_callback=progress_callback,
+            offset_date=offset_date,
+            end_date=end_date,
+            safe_date_boundary=safe_date_boundary,
+            quiet=quiet
+        )
+        
+        if not jsonl_path:
+            return [msg async for msg in messages]
+        
+        # 流式写入：获取循环作为生产者，后台任务作为消费者写文件，队列满时生产者等待
+        queue = asyncio.Queue(maxsize=1024)
+        writer = asyncio.create_task(self._jsonl_writer(queue, jsonl_path))
+        
+        async def put(item):
+            """放入队列；写入任务异常结束（如无法创建文件、磁盘已满）时抛出其异常，而不是在满队列上一直等待"""
+            if writer.done():
+                writer.result()
+            if not queue.full():
+                queue.put_nowait(item)
+                return
+            put_task = asyncio.ensure_future(queue.put(item))
+            await asyncio.wait((put_task, writer), return_when=asyncio.FIRST_COMPLETED)
+            if not put_task.done():
+                put_task.cancel()
+                writer.result()
+        
+        try:
+            async for msg in messages:
+                await put(msg)
+        finally:
+            await messages.aclose()
+            # 写入任务仍在运行时发送结束标记；之后等待其完成，写入失败时在此抛出异常
+            if not writer.done():
+                await put(None)
+            await writer
+        if not quiet:
+            print(f"  已写入: {jsonl_path}")
+        return []
+    
+    async def iter_messages(
+        self,
+        limit: int = None,
+        min_reactions: int = None,
+        media_only: bool = None,
+        progress_callback=None,
+        offset_date: datetime = None,
+        end_date: datetime = None,
+        safe_date_boundary: bool = False,
+        quiet: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐条获取消息和反应数据（异步生成器，符合条件的消息解析后立即产出）
+        
         Args:
             limit: 最大消息数量
             min_reactions: 最小反应数阈值
@@ -268,9 +417,11 @@ class TelegramFetcher:
             progress_callback: 进度回调函数
             offset_date: 开始日期（获取此日期之后的消息）
             end_date: 结束日期（获取此日期之前的消息，用于 iter_messages 的 offset_date）
+            safe_date_boundary: 到达开始日期后再多检查若干条消息才终止（不信任返回顺序时使用）
+            quiet: 不输出开始/完成信息和进度（多个获取并发进行时使用，避免输出交错）
             
-        Returns:
-            list: 消息数据列表
+        Yields:
+            dict: 消息数据
         """
         # 如果 limit 为 None，则不限制消息数量
         if limit is None:
@@ -280,26 +431,38 @@ class TelegramFetcher:
         min_reactions = min_reactions if min_reactions is not None else config.MIN_REACTIONS
         media_only = media_only if media_only is not None else config.MEDIA_ONLY
         
-        print(f"\n开始获取消息...")
-        print(f"  最大数量: {limit}")
-        print(f"  最小反应数: {min_reactions}")
-        print(f"  仅媒体消息: {'是' if media_only else '否'}")
-        if offset_date:
-            print(f"  开始日期: {offset_date}")
-        if end_date:
-            print(f"  结束日期: {end_date}")
-        print()
+        if not quiet:
+            print(f"\n开始获取消息...")
+            print(f"  最大数量: {limit}")
+            print(f"  最小反应数: {min_reactions}")
+            print(f"  仅媒体消息: {'是' if media_only else '否'}")
+            if offset_date:
+                print(f"  开始日期: {offset_date}")
+            if end_date:
+                print(f"  结束日期: {end_date}")
+            print()
         
-        messages_data = []
+        collected = 0
         processed = 0
+        get_reaction_info = self._get_reaction_info
+        batch_size = config.BATCH_SIZE
+        limiter = self._limiter
         skipped_no_reactions = 0
         skipped_no_media = 0
         skipped_out_of_range = 0
         
-        # 创建进度条（如果可用，且有限制数量时）
+        # 创建进度条（如果可用，且输出到终端时；无限制数量时只显示计数）
+        # 限制刷新频率，避免大量消息时频繁格式化和写终端
         pbar = None
-        if HAS_TQDM and limit != float('inf'):
-            pbar = tqdm(total=limit, desc="获取消息", unit="条")
+        if HAS_TQDM and not quiet and sys.stderr.isatty():
+            pbar = tqdm(
+                total=None if limit == float('inf') else limit,
+                desc="获取消息",
+                unit="条",
+                mininterval=1.0,
+                miniters=100,
+                smoothing=0.1
+            )
         
         try:
             # 使用 offset_date 参数让 Telegram API 从指定日期开始返回消息
@@ -307,97 +470,139 @@ class TelegramFetcher:
             # offset_date 是获取此日期之前的消息
             # 如果是无限制，则不传入 limit 参数
             iter_limit = None if limit == float('inf') else limit
-            async for message in self.client.iter_messages(self.channel, limit=iter_limit, offset_date=end_date):
-                processed += 1
-                
-                # 更新进度条
-                if pbar:
-                    pbar.update(1)
-                elif processed % 100 == 0:
-                    print(f"  已处理: {processed} 条消息...")
-                
-                # 检查日期范围 - 如果消息日期早于开始日期，提前终止
-                if offset_date and message.date < offset_date:
-                    skipped_out_of_range += 1
-                    # 由于消息是按时间倒序的，一旦遇到早于开始日期的消息，后面的都会更早
-                    # 但为了保险起见，我们累计跳过一定数量后终止
-                    if skipped_out_of_range >= 10:
-                        print(f"\n已到达开始日期边界，提前终止获取")
-                        break
-                    continue
-                
-                # 跳过没有反应的消息
-                if not message.reactions:
-                    skipped_no_reactions += 1
-                    continue
-                
-                # 获取媒体信息
-                media_info = self._get_media_info(message)
-                
-                # 如果只要媒体消息，跳过没有媒体的
-                if media_only and not media_info['has_media']:
-                    skipped_no_media += 1
-                    continue
-                
-                # 解析反应
-                reactions = []
-                total_reactions = 0
-                for r in message.reactions.results:
-                    reaction_info = self._get_reaction_info(r)
-                    reactions.append(reaction_info)
-                    total_reactions += reaction_info['count']
-                
-                # 过滤低于阈值的消息
-                if total_reactions < min_reactions:
-                    skipped_no_reactions += 1
-                    continue
-                
-                # 构建消息数据
-                msg_data = {
-                    'id': message.id,
-                    'date': message.date,
-                    'text': message.text or '',
-                    'media': media_info,
-                    'reactions': reactions,
-                    'total_reactions': total_reactions,
-                    'views': message.views,
-                    'forwards': message.forwards,
-                    'replies': message.replies.replies if message.replies else 0,
-                    'link': self._get_message_link(message.id),
-                }
-                
-                messages_data.append(msg_data)
-                
-                # 回调
-                if progress_callback:
-                    progress_callback(processed, len(messages_data))
-                
-                # 批次延迟
-                if processed % config.BATCH_SIZE == 0:
-                    await asyncio.sleep(config.BATCH_DELAY)
-                    
-        except FloodWaitError as e:
-            print(f"\n⚠ 触发速率限制，需要等待 {e.seconds} 秒...")
-            if pbar:
-                pbar.close()
-            await asyncio.sleep(e.seconds)
-            # 这里可以选择重试或返回已获取的数据
-            print("继续处理已获取的数据...")
+            entity = self.input_channel if self.input_channel is not None else self.channel
+            last_id = 0
+            while True:
+                # FloodWait 后从最后处理的消息之后继续，只请求剩余数量
+                remaining = None if iter_limit is None else iter_limit - processed
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    async for message in self.client.iter_messages(
+                        entity,
+                        limit=remaining,
+                        offset_date=None if last_id else end_date,
+                        offset_id=last_id
+                    ):
+                        processed += 1
+                        last_id = message.id
+                        
+                        # 更新进度条
+                        if pbar:
+                            pbar.update(1)
+                        elif not quiet and processed % 100 == 0:
+                            print(f"  已处理: {processed} 条消息...")
+                        
+                        # 检查日期范围 - 如果消息日期早于开始日期，提前终止
+                        if offset_date and message.date < offset_date:
+                            skipped_out_of_range += 1
+                            # 由于消息是按时间倒序的，一旦遇到早于开始日期的消息，后面的都会更早，直接终止
+                            # 保险模式下沿用旧行为：累计跳过一定数量后才终止
+                            if not safe_date_boundary or skipped_out_of_range >= 10:
+                                if not quiet:
+                                    print(f"\n已到达开始日期边界（第 {processed} 条消息），提前终止获取")
+                                break
+                            continue
+                        
+                        # 跳过没有反应的消息
+                        if not message.reactions:
+                            skipped_no_reactions += 1
+                            continue
+                        
+                        # 如果只要媒体消息，跳过没有媒体的（直接看原始字段，无需先构建媒体信息）
+                        if media_only and not message.media:
+                            skipped_no_media += 1
+                            continue
+                        
+                        # 先只累加反应数，过滤低于阈值的消息
+                        results = message.reactions.results
+                        total_reactions = sum(r.count for r in results)
+                        if total_reactions < min_reactions:
+                            skipped_no_reactions += 1
+                            continue
+                        
+                        # 通过阈值后再解析每个反应
+                        reactions = [get_reaction_info(r) for r in results]
+                        
+                        # 通过全部筛选后才构建媒体信息、链接等较重的字段
+                        msg_data = {
+                            'id': message.id,
+                            'date': message.date,
+                            'text': message.text or '',
+                            'media': self._get_media_info(message),
+                            'reactions': reactions,
+                            'total_reactions': total_reactions,
+                            'views': message.views,
+                            'forwards': message.forwards,
+                            'replies': message.replies.replies if message.replies else 0,
+                            'link': self._get_message_link(message.id),
+                        }
+                        
+                        yield msg_data
+                        collected += 1
+                        
+                        # 回调
+                        if progress_callback:
+                            progress_callback(processed, collected)
+                        
+                        # 批次限速：只在超过配置速率时才等待
+                        if limiter and processed % batch_size == 0:
+                            await limiter.acquire(batch_size)
+                    break
+                except FloodWaitError as e:
+                    # 等待服务器要求的时间后重试，附加随机抖动避免与其他客户端同时重试
+                    print(f"\n⚠ 触发速率限制，需要等待 {e.seconds} 秒后继续...")
+                    await asyncio.sleep(e.seconds + 1 + random.uniform(0, 0.5))
         
         finally:
             if pbar:
                 pbar.close()
         
+        if quiet:
+            return
+        
         print(f"\n获取完成!")
         print(f"  总处理: {processed} 条消息")
-        print(f"  有效消息: {len(messages_data)} 条")
+        print(f"  有效消息: {collected} 条")
         print(f"  跳过（反应不足）: {skipped_no_reactions} 条")
         if media_only:
             print(f"  跳过（无媒体）: {skipped_no_media} 条")
         if offset_date:
             print(f"  跳过（超出日期范围）: {skipped_out_of_range} 条")
+    
+    @staticmethod
+    async def _jsonl_writer(queue: asyncio.Queue, path: str):
+        """
+        消费队列中的消息并逐行写入 JSON Lines 文件
+        
+        每次取出队列中已就绪的全部消息，序列化后在线程中写入，避免阻塞事件循环。
+        消息中的 datetime 原样保留，由 orjson（或标准库的 default 钩子）直接序列化。
+        收到 None 时结束。
         
-        return messages_data
+        Args:
+            queue: 消息队列
+            path: 输出文件路径
+        """
+        loop = asyncio.get_running_loop()
+        with open(path, 'wb') as f:
+            done = False
+            while not done:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                if HAS_ORJSON:
+                    data = b''.join(
+                        orjson.dumps(msg, option=orjson.OPT_APPEND_NEWLINE) for msg in batch
+                    )
+                else:
+                    data = ''.join(
+                        json.dumps(msg, ensure_ascii=False, default=datetime.isoformat) + '\n'
+                        for msg in batch
+                    ).encode('utf-8')
+                await loop.run_in_executor(None, f.write, data)
     
     async def list_dialogs(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -411,7 +616,8 @@ class TelegramFetcher:
         """
         dialogs = []
         
-        async for dialog in self.client.iter_dialogs(limit=limit):
+        # 跳过已迁移为超级群组的旧群组，避免重复条目
+        async for dialog in self.client.iter_dialogs(limit=limit, ignore_migrated=True):
             if isinstance(dialog.entity, (Channel, Chat)):
                 dialogs.append({
                     'id': dialog.id,
@@ -436,10 +642,12 @@ async def main():
         print("\n你加入的频道/群组:")
         print("-" * 50)
         dialogs = await fetcher.list_dialogs(20)
+        lines = []
         for i, d in enumerate(dialogs, 1):
             prefix = "📢" if d['is_channel'] else "👥"
             username = f" (@{d['username']})" if d['username'] else ""
-            print(f"{i}. {prefix} {d['name']}{username}")
+            lines.append(f"{i}. {prefix} {d['name']}{username}\n")
+        sys.stdout.write(''.join(lines))
         
         # 如果配置了目标频道，尝试获取
         if config.TARGET_CHANNEL and config.TARGET_CHANNEL != "your_channel_username":
@@ -450,7 +658,7 @@ async def main():
                 
                 if messages:
                     print("\nTop 5 消息预览:")
-                    sorted_msgs = sorted(messages, key=lambda x: x['total_reactions'], reverse=True)
+                    sorted_msgs = sorted(messages, key=itemgetter('total_reactions'), reverse=True)
                     for msg in sorted_msgs[:5]:
                         text_preview = (msg['text'][:50] + '...') if len(msg['text']) > 50 else msg['text'] or '[媒体]'
                         print(f"  [{msg['total_reactions']}反应] {text_preview}")
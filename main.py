@@ -14,7 +14,14 @@ Telegram Reaction Counter - 主程序入口
 import asyncio
 import argparse
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+# 可选：基于 libuv 的高性能事件循环（不支持 Windows）
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
 
 # 导入自定义模块
 import config
@@ -38,6 +45,7 @@ def parse_args():
   python main.py --min-reactions 10       只统计反应数 >= 10 的消息
   python main.py --export json            只导出 JSON 格式
   python main.py --report                 生成 Markdown/HTML 报告
+  python main.py --jsonl raw.jsonl        将获取的消息流式写入 JSON Lines 文件
         """
     )
     
@@ -125,6 +133,19 @@ def parse_args():
         help='只统计最近 N 天的消息'
     )
     
+    parser.add_argument(
+        '--safe-date-boundary',
+        action='store_true',
+        help='到达开始日期后多检查若干条消息再停止获取（默认遇到第一条更早的消息即停止）'
+    )
+    
+    parser.add_argument(
+        '--jsonl',
+        type=str,
+        metavar='FILE',
+        help='将获取的消息流式写入 JSON Lines 文件（不在内存中保留，跳过分析）'
+    )
+    
     parser.add_argument(
         '--quiet', '-q',
         action='store_true',
@@ -146,24 +167,28 @@ async def list_dialogs(fetcher: TelegramFetcher):
     channels = [d for d in dialogs if d['is_channel']]
     groups = [d for d in dialogs if not d['is_channel']]
     
+    # 先拼好全部输出，最后一次性写出
+    out = []
+    
     if channels:
-        print("📢 频道:")
+        out.append("📢 频道:\n")
         for i, d in enumerate(channels, 1):
             username = f" (@{d['username']})" if d['username'] else ""
-            print(f"   {i}. {d['name']}{username}")
-        print()
+            out.append(f"   {i}. {d['name']}{username}\n")
+        out.append("\n")
     
     if groups:
-        print("👥 群组:")
+        out.append("👥 群组:\n")
         for i, d in enumerate(groups, 1):
             username = f" (@{d['username']})" if d['username'] else ""
-            print(f"   {i}. {d['name']}{username}")
-        print()
+            out.append(f"   {i}. {d['name']}{username}\n")
+        out.append("\n")
     
-    print(f"共计: {len(channels)} 个频道, {len(groups)} 个群组")
-    print()
-    print("提示: 使用 --channel 参数指定要统计的频道/群组")
-    print("例如: python main.py --channel @channel_name")
+    out.append(f"共计: {len(channels)} 个频道, {len(groups)} 个群组\n")
+    out.append("\n")
+    out.append("提示: 使用 --channel 参数指定要统计的频道/群组\n")
+    out.append("例如: python main.py --channel @channel_name\n")
+    sys.stdout.write(''.join(out))
 
 
 async def run_analysis(args):
@@ -193,11 +218,30 @@ async def run_analysis(args):
         
         print()
         
+        # 按日期范围获取：直接作为获取的开始日期，到达边界即停止，无需事后再过滤
+        fetch_offset_date = None
+        if args.days:
+            fetch_offset_date = datetime.now(timezone.utc) - timedelta(days=args.days)
+        
+        # 原始数据导出模式：边获取边写入文件，不做分析
+        if args.jsonl:
+            await fetcher.fetch_messages(
+                limit=args.limit,
+                min_reactions=args.min_reactions,
+                media_only=not args.no_media,
+                offset_date=fetch_offset_date,
+                jsonl_path=args.jsonl,
+                safe_date_boundary=args.safe_date_boundary
+            )
+            return
+        
         # 获取消息
         messages = await fetcher.fetch_messages(
             limit=args.limit,
             min_reactions=args.min_reactions,
-            media_only=not args.no_media
+            media_only=not args.no_media,
+            offset_date=fetch_offset_date,
+            safe_date_boundary=args.safe_date_boundary
         )
         
         if not messages:
@@ -222,11 +266,6 @@ async def run_analysis(args):
             filtered_messages = analyzer.filter_by_keyword(keywords, messages=filtered_messages)
             print(f"按关键词过滤后: {len(filtered_messages)} 条消息")
         
-        # 按日期过滤
-        if args.days:
-            filtered_messages = analyzer.filter_by_date_range(days=args.days, messages=filtered_messages)
-            print(f"按日期过滤后: {len(filtered_messages)} 条消息")
-        
         if not filtered_messages:
             print("\n⚠ 过滤后没有消息")
             return
@@ -235,7 +274,10 @@ async def run_analysis(args):
         analyzer.messages = filtered_messages
         
         # 排序
-        if args.sort_by == 'views':
+        if args.export == 'none' and not args.report:
+            # 只用于终端显示时，用堆取出前 N 条即可，无需对全部消息排序
+            sorted_messages = analyzer.get_top_n(args.top, sort_by=args.sort_by)
+        elif args.sort_by == 'views':
             sorted_messages = analyzer.sort_by_views()
         elif args.sort_by == 'engagement':
             sorted_messages = analyzer.sort_by_engagement_rate()
@@ -339,6 +381,19 @@ def print_banner():
     print(banner)
 
 
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    创建事件循环
+    
+    已安装 uvloop 时使用其 C 实现的事件循环。
+    
+    注意：不能启用 asyncio.eager_task_factory。Telethon 连接时先创建收发循环任务，
+    之后才标记为已连接；eager 模式下任务在创建时立即同步执行，看到未连接状态就直接退出，
+    客户端将无法收发任何数据。
+    """
+    return uvloop.new_event_loop() if HAS_UVLOOP else asyncio.new_event_loop()
+
+
 def main():
     """主函数"""
     args = parse_args()
@@ -351,7 +406,12 @@ def main():
         sys.exit(1)
     
     # 运行
-    asyncio.run(run_analysis(args))
+    if sys.version_info >= (3, 12):
+        asyncio.run(run_analysis(args), loop_factory=_new_event_loop)
+    else:
+        if HAS_UVLOOP:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        asyncio.run(run_analysis(args))
 
 
 if __name__ == "__main__":
@@ -4,13 +4,42 @@ Telegram Reaction Counter - Web 可视化界面
 """
 
 import asyncio
+import glob
+import heapq
 import os
+import re
 import sys
 import threading
 import time
 import traceback
-
-from flask import Flask, render_template, request, jsonify, send_file
+import unicodedata
+from datetime import datetime
+from functools import lru_cache, partial
+
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import generate_etag
+
+# 可选：基于 libuv 的高性能事件循环（不支持 Windows）
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
+# 可选：支持按字素簇（\X）匹配的正则库
+try:
+    import regex
+    HAS_REGEX = True
+except ImportError:
+    HAS_REGEX = False
+
+# 可选：更快的 JSON 序列化（原生支持 datetime）
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 from telethon import TelegramClient
 from telethon.errors import (
@@ -24,10 +53,106 @@ from telethon.errors import (
 import config
 from fetcher import TelegramFetcher
 from analyzer import MessageAnalyzer
-from exporter import Exporter
+from exporter import Exporter, iter_json_export
+
+
+class _JSONProvider(DefaultJSONProvider):
+    """消息中保留 datetime 对象，只在返回响应时序列化为 ISO 8601 字符串"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+    
+    def dumps(self, obj, **kwargs):
+        # 已安装 orjson 时用其 C 实现序列化（输出本身就是紧凑格式）；
+        # 调试模式下需要缩进输出时回退到标准库
+        if HAS_ORJSON and 'indent' not in kwargs:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
+app.json = _JSONProvider(app)
+
+# 设置环境变量 TRC_DEBUG=1 时输出调试信息
+DEBUG = os.environ.get('TRC_DEBUG') == '1'
+
+
+def _debug(*args):
+    """输出调试信息（仅在 DEBUG 模式下）"""
+    if DEBUG:
+        print('[DEBUG]', *args)
+
+
+# 相同条件再次分析时复用已获取消息的有效期（秒）
+_FETCH_CACHE_TTL = 300
+
+# 已知起止日期时，把时间范围等分为若干段并发获取（需在配置中开启，旧配置文件没有此项时不分段）
+_FETCH_BUCKETS = getattr(config, 'FETCH_BUCKETS', 1)
+
+# 手机号中的非数字字符
+_NON_DIGITS_RE = re.compile(r'\D')
+
+
+@lru_cache(maxsize=32)
+def _session_name(phone):
+    """根据手机号生成 session 文件名（同一手机号会反复调用，结果缓存）"""
+    return f"session_{_NON_DIGITS_RE.sub('', phone)}"
+
+
+def _remove_session_file(filename):
+    """
+    删除 session 文件，以及 SQLite 留在其旁边的日志文件（如存在）
+    
+    直接删除并处理文件不存在的情况，不预先检查
+    
+    Returns:
+        bool: session 文件是否存在并已删除
+    """
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        return False
+    
+    for suffix in ('-wal', '-shm', '-journal'):
+        try:
+            os.remove(filename + suffix)
+        except FileNotFoundError:
+            pass
+    return True
+
+
+# 变体选择符 (FE0E, FE0F) 和零宽连接符
+_EMOJI_STRIP_TABLE = str.maketrans('', '', '\ufe0e\ufe0f\u200d')
+
+# 单个字素簇（用户看到的一个字符，可能由多个码点组成）
+_GRAPHEME_RE = regex.compile(r'\X') if HAS_REGEX else None
+
+
+@lru_cache(maxsize=512)
+def _normalize_emoji(e):
+    """规范化 emoji，移除变体选择符等（反应表情大量重复，结果缓存）"""
+    if not e:
+        return ''
+    # 使用 NFC 规范化，纯 ASCII 字符串规范化后不变
+    normalized = e if e.isascii() else unicodedata.normalize('NFC', e)
+    return normalized.translate(_EMOJI_STRIP_TABLE).strip()
+
+
+@lru_cache(maxsize=512)
+def _get_emoji_base(e):
+    """获取 emoji 的基础字符（只取第一个字符簇，忽略肤色等修饰）"""
+    if HAS_REGEX:
+        # 在移除零宽连接符之前切分字素簇，ZWJ 序列、国旗等多码点 emoji 作为一个整体
+        match = _GRAPHEME_RE.match(unicodedata.normalize('NFC', e.strip())) if e else None
+        return match.group(0).translate(_EMOJI_STRIP_TABLE) if match else ''
+    
+    cleaned = _normalize_emoji(e)
+    # 返回第一个字符（对于简单 emoji）
+    return cleaned if len(cleaned) <= 1 else cleaned[:2]
 
 
 class TelegramManager:
@@ -51,22 +176,32 @@ class TelegramManager:
             'message': '',
             'data': None
         }
+        # 完整的排序结果只用于导出，单独保存，不随进度轮询返回
+        self.all_messages = None
+        # 非空时 all_messages 尚未排序，导出时调用它生成完整的排序结果
+        self._all_messages_factory = None
+        # 上次获取的消息：(获取条件, 获取时间, 消息列表, 频道信息)
+        self._last_fetch = None
         
         self._start_event_loop()
     
     def _start_event_loop(self):
         """在后台线程启动事件循环"""
+        ready = threading.Event()
+        
         def run_loop():
-            self.loop = asyncio.new_event_loop()
+            # 不启用 eager task factory：Telethon 的收发循环任务会在连接完成前同步执行并直接退出
+            self.loop = uvloop.new_event_loop() if HAS_UVLOOP else asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
+            # 循环开始运行后执行的第一个回调，通知启动线程
+            self.loop.call_soon(ready.set)
             self.loop.run_forever()
         
         self.thread = threading.Thread(target=run_loop, daemon=True)
         self.thread.start()
         
         # 等待循环启动
-        while self.loop is None or not self.loop.is_running():
-            time.sleep(0.05)
+        ready.wait()
     
     def run_async(self, coro, timeout=120):
         """在事件循环中运行协程并等待结果"""
@@ -82,8 +217,7 @@ class TelegramManager:
     
     def get_session_name(self, phone):
         """根据手机号生成 session 文件名"""
-        clean_phone = ''.join(filter(str.isdigit, phone))
-        return f"session_{clean_phone}"
+        return _session_name(phone)
     
     def reset(self):
         """重置状态"""
@@ -109,10 +243,19 @@ class TelegramManager:
             'message': '',
             'data': None
         }
+        self.all_messages = None
+        self._all_messages_factory = None
+    
+    def get_all_messages(self):
+        """获取完整的排序结果，按表情排序时在首次导出时才完成排序"""
+        if self._all_messages_factory is not None:
+            self.all_messages = self._all_messages_factory()
+            self._all_messages_factory = None
+        return self.all_messages
     
     async def _send_code_async(self, phone):
         """发送验证码 - 异步版本"""
-        print(f"[DEBUG] 开始发送验证码到: {phone}")
+        _debug(f"开始发送验证码到: {phone}")
         
         # 格式化手机号
         if not phone.startswith('+'):
@@ -120,23 +263,23 @@ class TelegramManager:
         
         self.phone = phone
         session_name = self.get_session_name(phone)
-        print(f"[DEBUG] Session 名称: {session_name}")
+        _debug(f"Session 名称: {session_name}")
         
         # 如果已有客户端，先断开
         if self.client:
-            print("[DEBUG] 断开现有客户端...")
+            _debug("断开现有客户端...")
             try:
                 if self.client.is_connected():
                     await self.client.disconnect()
             except Exception as e:
-                print(f"[DEBUG] 断开时出错: {e}")
+                _debug(f"断开时出错: {e}")
             self.client = None
         
         # 检查 API 凭证
-        print(f"[DEBUG] API_ID: {config.API_ID}, API_HASH: {config.API_HASH[:8]}...")
+        _debug(f"API_ID: {config.API_ID}, API_HASH: {config.API_HASH[:8]}...")
         
         # 创建新客户端
-        print("[DEBUG] 创建新客户端...")
+        _debug("创建新客户端...")
         self.client = TelegramClient(
             session_name,
             config.API_ID,
@@ -144,13 +287,13 @@ class TelegramManager:
         )
         
         # 连接
-        print("[DEBUG] 正在连接到 Telegram...")
+        _debug("正在连接到 Telegram...")
         await self.client.connect()
-        print(f"[DEBUG] 连接成功: {self.client.is_connected()}")
+        _debug(f"连接成功: {self.client.is_connected()}")
         
         # 检查是否已登录
         if await self.client.is_user_authorized():
-            print("[DEBUG] 已经登录，获取用户信息...")
+            _debug("已经登录，获取用户信息...")
             me = await self.client.get_me()
             self.is_logged_in = True
             self.user_info = {
@@ -163,36 +306,36 @@ class TelegramManager:
             self.fetcher = TelegramFetcher()
             self.fetcher.client = self.client
             
-            print(f"[DEBUG] 已登录用户: {self.user_info}")
+            _debug(f"已登录用户: {self.user_info}")
             return {'success': True, 'already_logged_in': True, 'user': self.user_info}
         
         # 发送验证码
-        print("[DEBUG] 发送验证码请求...")
+        _debug("发送验证码请求...")
         sent = await self.client.send_code_request(phone)
         self.phone_code_hash = sent.phone_code_hash
-        print(f"[DEBUG] 验证码已发送，phone_code_hash: {self.phone_code_hash[:10]}...")
+        _debug(f"验证码已发送，phone_code_hash: {self.phone_code_hash[:10]}...")
         
         return {'success': True, 'already_logged_in': False, 'message': '验证码已发送到 Telegram'}
     
     def send_code(self, phone):
         """发送验证码 - 同步包装"""
         try:
-            print(f"[DEBUG] send_code 开始: {phone}")
+            _debug(f"send_code 开始: {phone}")
             result = self.run_async(self._send_code_async(phone))
-            print(f"[DEBUG] send_code 结果: {result}")
+            _debug(f"send_code 结果: {result}")
             return result
         except PhoneNumberInvalidError:
-            print("[DEBUG] 手机号格式无效")
+            _debug("手机号格式无效")
             self.reset()
             return {'success': False, 'error': '手机号格式无效，请使用国际格式如 +8613800138000'}
         except FloodWaitError as e:
-            print(f"[DEBUG] FloodWait: {e.seconds}秒")
+            _debug(f"FloodWait: {e.seconds}秒")
             self.reset()
             return {'success': False, 'error': f'请求过于频繁，请等待 {e.seconds} 秒后重试'}
         except Exception as e:
             error_msg = str(e)
-            print(f"[DEBUG] 发送验证码异常: {error_msg}")
-            print(f"[DEBUG] 详细错误:\n{traceback.format_exc()}")
+            _debug(f"发送验证码异常: {error_msg}")
+            _debug(f"详细错误:\n{traceback.format_exc()}")
             self.reset()
             return {'success': False, 'error': f'发送验证码失败: {error_msg}'}
     
@@ -281,8 +424,7 @@ class TelegramManager:
         self.user_info = None
         
         # 如果需要删除 session 文件
-        if delete_session and session_file and os.path.exists(session_file):
-            os.remove(session_file)
+        if delete_session and session_file and _remove_session_file(session_file):
             return {'success': True, 'message': '已登出并删除登录状态'}
         
         return {'success': True, 'message': '已登出'}
@@ -315,56 +457,140 @@ class TelegramManager:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def _resolve_date_range(days, date_from=None, date_to=None):
+        """把界面上的时间选项换算为绝对的起止时间，不限制的一端为 None"""
+        from datetime import timedelta, timezone
+        
+        start_date = None
+        end_date = None
+        
+        if days == -1 and date_from:
+            # 自定义日期范围
+            try:
+                start_date = datetime.fromisoformat(date_from).replace(tzinfo=timezone.utc)
+                if date_to:
+                    end_date = datetime.fromisoformat(date_to).replace(tzinfo=timezone.utc, hour=23, minute=59, second=59)
+            except:
+                pass
+        elif days > 0:
+            start_date = datetime.now(timezone.utc) - timedelta(days=days)
+            end_date = datetime.now(timezone.utc)
+        # days == 0 表示全部消息，不设置日期限制
+        
+        return start_date, end_date
+    
+    async def _fetch_async(self, channel, start_date, end_date, min_reactions, media_only):
+        """获取频道消息，无法获取频道时设置错误状态并返回 None"""
+        self.task_progress['message'] = '正在获取频道信息...'
+        self.task_progress['progress'] = 10
+        
+        # 尝试获取频道
+        success = await self.fetcher.get_channel(channel)
+        if not success:
+            self.task_progress = {'status': 'error', 'progress': 0, 'message': '无法获取频道，请检查频道名称或确认已加入', 'data': None}
+            return None
+        
+        self.task_progress['message'] = '正在获取消息...'
+        self.task_progress['progress'] = 20
+        
+        # 获取消息 - 使用日期参数让 API 直接返回时间范围内的消息
+        # 不设置上限，获取时间范围内的所有消息
+        limit = None  # 无限制
+        
+        def progress_callback(processed, valid):
+            self.task_progress['message'] = f'已处理 {processed} 条消息，有效 {valid} 条'
+            self.task_progress['progress'] = 20 + min(int((processed / 1000) * 60), 60)
+        
+        if start_date and end_date and _FETCH_BUCKETS > 1:
+            return await self._fetch_buckets(start_date, end_date, min_reactions, media_only, progress_callback)
+        
+        return await self.fetcher.fetch_messages(
+            limit=limit,
+            min_reactions=min_reactions,
+            media_only=media_only,
+            progress_callback=progress_callback,
+            offset_date=start_date,
+            end_date=end_date
+        )
+    
+    async def _fetch_buckets(self, start_date, end_date, min_reactions, media_only, progress_callback, buckets=_FETCH_BUCKETS):
+        """
+        把时间范围等分为若干段，在同一客户端上并发获取各段消息
+        
+        各段的分页请求交替发出，网络往返相互重叠；结果按从新到旧拼接，顺序与整段获取一致。
+        各段共用获取器的限速器，总处理速率仍受 BATCH_DELAY/BATCH_SIZE 限制；
+        各段不单独输出信息，只在结束时输出一次汇总
+        """
+        step = (end_date - start_date) / buckets
+        # 从最新的一段开始，最后一段的结束日期直接使用 end_date，避免除法的舍入误差
+        bounds = [(start_date + step * i, start_date + step * (i + 1)) for i in reversed(range(buckets))]
+        bounds[0] = (bounds[0][0], end_date)
+        
+        # 各段的进度分别记录，汇总后再更新任务进度
+        processed = [0] * buckets
+        valid = [0] * buckets
+        
+        def make_callback(i):
+            def callback(p, v):
+                processed[i] = p
+                valid[i] = v
+                progress_callback(sum(processed), sum(valid))
+            return callback
+        
+        tasks = [
+            asyncio.ensure_future(self.fetcher.fetch_messages(
+                limit=None,
+                min_reactions=min_reactions,
+                media_only=media_only,
+                progress_callback=make_callback(i),
+                offset_date=lo,
+                end_date=hi,
+                quiet=True
+            ))
+            for i, (lo, hi) in enumerate(bounds)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # 任一段失败时取消其余各段，不在后台继续请求
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        # 相邻两段在边界时刻可能返回同一条消息
+        seen = set()
+        messages = []
+        for part in results:
+            for msg in part:
+                if msg['id'] not in seen:
+                    seen.add(msg['id'])
+                    messages.append(msg)
+        
+        print(f"\n分段获取完成: {buckets} 段，有效消息 {len(messages)} 条")
+        return messages
+    
     async def _analyze_async(self, channel, days, min_reactions, media_only, sort_by, emojis, date_from=None, date_to=None):
         """分析频道 - 异步版本"""
-        from datetime import datetime, timedelta, timezone
-        
         try:
-            self.task_progress['message'] = '正在获取频道信息...'
-            self.task_progress['progress'] = 10
-            
-            # 尝试获取频道
-            success = await self.fetcher.get_channel(channel)
-            if not success:
-                self.task_progress = {'status': 'error', 'progress': 0, 'message': '无法获取频道，请检查频道名称或确认已加入', 'data': None}
-                return
-            
-            self.task_progress['message'] = '正在获取消息...'
-            self.task_progress['progress'] = 20
-            
-            # 计算时间范围
-            start_date = None
-            end_date = None
+            from datetime import timezone
             
-            if days == -1 and date_from:
-                # 自定义日期范围
-                try:
-                    start_date = datetime.fromisoformat(date_from).replace(tzinfo=timezone.utc)
-                    if date_to:
-                        end_date = datetime.fromisoformat(date_to).replace(tzinfo=timezone.utc, hour=23, minute=59, second=59)
-                except:
-                    pass
-            elif days > 0:
-                start_date = datetime.now(timezone.utc) - timedelta(days=days)
-                end_date = datetime.now(timezone.utc)
-            # days == 0 表示全部消息，不设置日期限制
-            
-            # 获取消息 - 使用日期参数让 API 直接返回时间范围内的消息
-            # 不设置上限，获取时间范围内的所有消息
-            limit = None  # 无限制
-            
-            def progress_callback(processed, valid):
-                self.task_progress['message'] = f'已处理 {processed} 条消息，有效 {valid} 条'
-                self.task_progress['progress'] = 20 + min(int((processed / 1000) * 60), 60)
-            
-            messages = await self.fetcher.fetch_messages(
-                limit=limit,
-                min_reactions=min_reactions,
-                media_only=media_only,
-                progress_callback=progress_callback,
-                offset_date=start_date,
-                end_date=end_date
-            )
+            start_date, end_date = self._resolve_date_range(days, date_from, date_to)
+            # 同一账号、频道和获取条件在短时间内再次分析时（如只修改排序方式或表情），
+            # 直接复用上次获取的消息，只重新排序。
+            # 只缓存结束时间已过去的范围："最近 N 天"和"全部消息"会包含新消息，每次都重新获取
+            fetch_key = (self.fetcher, channel, start_date, end_date, min_reactions, media_only)
+            cacheable = end_date is not None and end_date <= datetime.now(timezone.utc)
+            last_fetch = self._last_fetch
+            if cacheable and last_fetch and last_fetch[0] == fetch_key and time.monotonic() - last_fetch[1] < _FETCH_CACHE_TTL:
+                messages, channel_info = last_fetch[2], last_fetch[3]
+            else:
+                messages = await self._fetch_async(channel, start_date, end_date, min_reactions, media_only)
+                if messages is None:
+                    return
+                channel_info = self.fetcher.channel_info
+                if cacheable:
+                    self._last_fetch = (fetch_key, time.monotonic(), messages, channel_info)
             
             if not messages:
                 self.task_progress = {'status': 'error', 'progress': 0, 'message': '没有找到符合条件的消息', 'data': None}
@@ -376,9 +602,13 @@ class TelegramManager:
             analyzer = MessageAnalyzer(messages)
             
             # 排序逻辑：如果选择了表情，优先按表情数量排序
+            all_messages_factory = None
             if emojis and len(emojis) > 0:
                 # 有选中的表情，按选中表情数量排序
-                sorted_messages = self._sort_by_emojis(messages, emojis)
+                # 界面只显示前 100 条，用堆选出即可；完整排序推迟到导出时
+                top_messages = self._sort_by_emojis(messages, emojis, top_n=100)
+                sorted_messages = messages
+                all_messages_factory = partial(self._sort_by_emojis, messages, emojis)
             elif sort_by == 'views':
                 sorted_messages = analyzer.sort_by_views()
             elif sort_by == 'engagement':
@@ -387,32 +617,25 @@ class TelegramManager:
                 sorted_messages = analyzer.sort_by_replies()
             else:
                 sorted_messages = analyzer.sort_by_reactions()
+            if all_messages_factory is None:
+                top_messages = sorted_messages[:100]
             
             stats = analyzer.generate_summary()
             
             self.task_progress['message'] = '正在准备结果...'
             self.task_progress['progress'] = 95
             
-            # 处理日期序列化
-            for msg in sorted_messages:
-                if msg.get('date'):
-                    msg['date'] = msg['date'].isoformat()
-            
-            if stats.get('date_range'):
-                if stats['date_range'].get('start'):
-                    stats['date_range']['start'] = stats['date_range']['start'].isoformat()
-                if stats['date_range'].get('end'):
-                    stats['date_range']['end'] = stats['date_range']['end'].isoformat()
-            
+            # 日期保持 datetime 对象，由 _JSONProvider 在返回响应时序列化
+            self.all_messages = sorted_messages
+            self._all_messages_factory = all_messages_factory
             self.task_progress = {
                 'status': 'completed',
                 'progress': 100,
                 'message': '分析完成',
                 'data': {
-                    'messages': sorted_messages[:100],
-                    'all_messages': sorted_messages,
+                    'messages': top_messages,
                     'stats': stats,
-                    'channel_info': self.fetcher.channel_info,
+                    'channel_info': channel_info,
                     'total_count': len(sorted_messages)
                 }
             }
@@ -425,44 +648,29 @@ class TelegramManager:
                 'data': None
             }
     
-    def _sort_by_emojis(self, messages, emojis):
-        """按指定表情的总反应数量排序"""
-        import unicodedata
-        
-        # 规范化 emoji，移除变体选择符等
-        def normalize_emoji(e):
-            if not e:
-                return ''
-            # 使用 NFC 规范化
-            normalized = unicodedata.normalize('NFC', e)
-            # 移除变体选择符 (FE0E, FE0F) 和零宽连接符
-            normalized = normalized.replace('\ufe0e', '').replace('\ufe0f', '').replace('\u200d', '')
-            return normalized.strip()
-        
-        # 获取 emoji 的基础字符（只取第一个字符簇）
-        def get_emoji_base(e):
-            if not e:
-                return ''
-            # 移除所有修饰符
-            cleaned = normalize_emoji(e)
-            # 只取前面的主要表情（忽略肤色等修饰）
-            if len(cleaned) > 0:
-                # 返回第一个字符（对于简单 emoji）
-                return cleaned[0] if len(cleaned) == 1 else cleaned[:2]
-            return cleaned
+    def _sort_by_emojis(self, messages, emojis, top_n=None):
+        """
+        按指定表情的总反应数量排序，指定 top_n 时只返回前 top_n 条
         
+        不修改原消息（可能被后续分析复用），返回附带 selected_emoji_count 字段的消息副本
+        """
         # 将选中的 emojis 规范化后存入多个格式以便匹配
         emoji_set = set()
         emoji_base_set = set()
         for e in emojis:
-            normalized = normalize_emoji(e)
-            base = get_emoji_base(e)
+            normalized = _normalize_emoji(e)
+            base = _get_emoji_base(e)
             emoji_set.add(normalized)
             emoji_set.add(e)  # 原始形式
             emoji_base_set.add(base)
-            print(f"[DEBUG] 添加表情: 原始='{e}' 规范化='{normalized}' 基础='{base}' (bytes: {e.encode('unicode_escape')})")
+            if DEBUG:
+                _debug(f"添加表情: 原始='{e}' 规范化='{normalized}' 基础='{base}' (bytes: {e.encode('unicode_escape')})")
         
-        print(f"[DEBUG] 选中的表情集合: {emoji_set}")
+        if DEBUG:
+            _debug(f"选中的表情集合: {emoji_set}")
+        
+        # 每种反应表情只做一次多方式匹配，之后每条反应只需一次字典查找
+        match_cache = {}
         
         def get_emoji_count(msg):
             """计算消息中所有选中表情的反应总数"""
@@ -470,45 +678,48 @@ class TelegramManager:
             reactions = msg.get('reactions', [])
             for r in reactions:
                 original_emoji = r.get('emoji', '')
-                normalized_emoji = normalize_emoji(original_emoji)
-                base_emoji = get_emoji_base(original_emoji)
-                count = r.get('count', 0)
+                matched = match_cache.get(original_emoji)
                 
-                # 多种方式匹配
-                matched = (
-                    original_emoji in emoji_set or
-                    normalized_emoji in emoji_set or
-                    base_emoji in emoji_base_set
-                )
+                if matched is None:
+                    # 多种方式匹配，前一种命中时不再计算后面的规范化形式
+                    matched = match_cache[original_emoji] = (
+                        original_emoji in emoji_set or
+                        _normalize_emoji(original_emoji) in emoji_set or
+                        _get_emoji_base(original_emoji) in emoji_base_set
+                    )
                 
                 if matched:
-                    total += count
-                    # print(f"[DEBUG] 匹配到表情 {original_emoji}: +{count}")
+                    total += r.get('count', 0)
+                    # _debug(f"匹配到表情 {original_emoji}: +{r.get('count', 0)}")
             return total
         
         # 计算每个消息的指定表情反应总数
-        for msg in messages:
-            count = get_emoji_count(msg)
-            msg['selected_emoji_count'] = count
-        
-        # 按选中表情的总反应数量降序排序
-        sorted_messages = sorted(
-            messages,
-            key=lambda x: x.get('selected_emoji_count', 0),
-            reverse=True
-        )
+        counts = [get_emoji_count(msg) for msg in messages]
+        
+        # 按选中表情的总反应数量降序排序；只需前 N 条时用堆选出，无需全部排序
+        indices = range(len(messages))
+        if top_n is not None:
+            order = heapq.nlargest(top_n, indices, key=counts.__getitem__)
+        else:
+            order = sorted(indices, key=counts.__getitem__, reverse=True)
         
-        # Debug: 打印前10条消息的排序信息
-        print(f"[DEBUG] 排序后前10条消息:")
-        for i, msg in enumerate(sorted_messages[:10]):
-            reactions_str = ', '.join([f"{r['emoji']}:{r['count']}" for r in msg.get('reactions', [])])
-            print(f"  #{i+1}: selected_emoji_count={msg.get('selected_emoji_count', 0)}, reactions=[{reactions_str}]")
+        # 只为返回的消息生成副本
+        sorted_messages = [{**messages[i], 'selected_emoji_count': counts[i]} for i in order]
+        
+        # Debug: 打印前10条消息的排序信息（未开启调试时跳过字符串拼接）
+        if DEBUG:
+            _debug("排序后前10条消息:")
+            for i, msg in enumerate(sorted_messages[:10]):
+                reactions_str = ', '.join([f"{r['emoji']}:{r['count']}" for r in msg.get('reactions', [])])
+                print(f"  #{i+1}: selected_emoji_count={msg.get('selected_emoji_count', 0)}, reactions=[{reactions_str}]")
         
         return sorted_messages
     
     def start_analysis(self, channel, days, min_reactions, media_only, sort_by, emojis=None, date_from=None, date_to=None):
         """开始分析"""
         self.task_progress = {'status': 'running', 'progress': 0, 'message': '正在初始化...', 'data': None}
+        self.all_messages = None
+        self._all_messages_factory = None
         
         asyncio.run_coroutine_threadsafe(
             self._analyze_async(channel, days, min_reactions, media_only, sort_by, emojis or [], date_from, date_to),
@@ -521,6 +732,9 @@ class TelegramManager:
 # 创建全局管理器
 manager = TelegramManager()
 
+# /api/status 响应缓存：(状态键, ETag, JSON 字节串)
+_status_cache = None
+
 
 @app.route('/')
 def index():
@@ -529,17 +743,36 @@ def index():
 
 @app.route('/api/status')
 def get_status():
-    progress = manager.task_progress.copy()
-    if progress.get('data') and 'all_messages' in progress['data']:
-        progress['data'] = {k: v for k, v in progress['data'].items() if k != 'all_messages'}
-    
-    return jsonify({
-        'is_logged_in': manager.is_logged_in,
-        'user': manager.user_info,
-        'phone': manager.phone,
-        'awaiting_code': manager.phone_code_hash is not None and not manager.is_logged_in,
-        'task': progress
-    })
+    global _status_cache
+    
+    # 前端每秒轮询一次，状态未变化时复用上次序列化的结果
+    # 任务进度在分析过程中原地更新，因此单独比较其中会变化的字段
+    task = manager.task_progress
+    key = (
+        manager.is_logged_in,
+        manager.user_info,
+        manager.phone,
+        manager.phone_code_hash is not None,
+        task,
+        task.get('status'),
+        task.get('progress'),
+        task.get('message')
+    )
+    cached = _status_cache
+    if cached is None or cached[0] != key:
+        payload = app.json.dumps({
+            'is_logged_in': manager.is_logged_in,
+            'user': manager.user_info,
+            'phone': manager.phone,
+            'awaiting_code': manager.phone_code_hash is not None and not manager.is_logged_in,
+            'task': task
+        }).encode('utf-8')
+        cached = _status_cache = (key, generate_etag(payload), payload)
+    
+    response = Response(cached[2], mimetype='application/json')
+    response.set_etag(cached[1])
+    # 客户端的 If-None-Match 与 ETag 一致时返回 304，不再发送响应体
+    return response.make_conditional(request)
 
 
 @app.route('/api/send_code', methods=['POST'])
@@ -591,14 +824,13 @@ def logout():
 @app.route('/api/sessions')
 def list_sessions():
     sessions = []
-    for f in os.listdir('.'):
-        if f.startswith('session_') and f.endswith('.session'):
-            phone = f[8:-8]
-            if len(phone) > 4:
-                display = '+' + phone[:3] + '****' + phone[-4:]
-            else:
-                display = '+' + phone
-            sessions.append({'file': f, 'phone': '+' + phone, 'display': display})
+    for f in glob.glob('session_*.session'):
+        phone = f[8:-8]
+        if len(phone) > 4:
+            display = '+' + phone[:3] + '****' + phone[-4:]
+        else:
+            display = '+' + phone
+        sessions.append({'file': f, 'phone': '+' + phone, 'display': display})
     return jsonify({'success': True, 'sessions': sessions})
 
 
@@ -624,8 +856,7 @@ def delete_session():
     
     # 删除文件
     try:
-        if os.path.exists(filename):
-            os.remove(filename)
+        if _remove_session_file(filename):
             return jsonify({'success': True, 'message': '已删除'})
         else:
             return jsonify({'success': False, 'error': '文件不存在'})
@@ -663,10 +894,7 @@ def start_analysis():
 
 @app.route('/api/progress')
 def get_progress():
-    progress = manager.task_progress.copy()
-    if progress.get('data') and 'all_messages' in progress['data']:
-        progress['data'] = {k: v for k, v in progress['data'].items() if k != 'all_messages'}
-    return jsonify(progress)
+    return jsonify(manager.task_progress)
 
 
 @app.route('/api/export', methods=['POST'])
@@ -678,13 +906,19 @@ def export_data():
     format_type = data.get('format', 'json')
     
     try:
-        exporter = Exporter()
-        messages = manager.task_progress['data'].get('all_messages', manager.task_progress['data']['messages'])
+        messages = manager.get_all_messages() or manager.task_progress['data']['messages']
         stats = manager.task_progress['data']['stats']
         
         if format_type == 'json':
-            filepath = exporter.export_to_json(messages, include_stats=True, stats=stats)
-        elif format_type == 'csv':
+            # 逐条序列化后直接流式发送，不生成中间文件，也不在内存中拼出整份文档
+            return Response(
+                iter_json_export(messages, stats),
+                mimetype='application/json',
+                headers={'Content-Disposition': f'attachment; filename={config.OUTPUT_FILENAME}.json'}
+            )
+        
+        exporter = Exporter()
+        if format_type == 'csv':
             filepath = exporter.export_to_csv(messages)
         else:
             return jsonify({'success': False, 'error': '不支持的格式'})